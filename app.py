@@ -2,21 +2,27 @@
 
 import json
 import logging
+import os
 import secrets
 from contextlib import asynccontextmanager
-from typing import Optional
-from urllib.parse import urlencode
-
-from fastapi import Depends, FastAPI, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Annotated, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from pydantic import BaseModel, BeforeValidator, NonNegativeFloat
+from starlette.concurrency import run_in_threadpool
 
 import db
 import scheduler
-from config import SETTINGS_PASSWORD
+from config import JINJA_CACHE_DIR, SETTINGS_PASSWORD
 from notifier import send_test_webhook
 from tracker import compute_deals
 
@@ -27,6 +33,10 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Startup/shutdown lifecycle."""
     db.init_db()
+    # Compile every template up front so the first hit on each page is not
+    # paying for parsing.
+    for name in template_env.list_templates():
+        template_env.get_template(name)
     if db.get_setting("scheduler_enabled", False):
         scheduler.start_scheduler()
         stats = db.get_stats()
@@ -34,11 +44,20 @@ async def lifespan(app: FastAPI):
             scheduler.trigger_now()
     yield
     scheduler.stop_scheduler(disable=False)
+    db.close_shared_conns()
 
 
-app = FastAPI(title="3DP Deal Tracker", lifespan=lifespan)
+app = FastAPI(title="3DP Deal Tracker", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+template_env = Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=True,
+    auto_reload=False,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR),
+)
+templates = Jinja2Templates(env=template_env)
 
 
 def from_json_filter(value):
@@ -46,34 +65,55 @@ def from_json_filter(value):
         return []
     if isinstance(value, list):
         return value
+    # Plain strings are common; skip the raise/catch of a failed parse.
+    if not isinstance(value, str) or value[:1] not in ("[", "{"):
+        return []
     try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
         return []
 
 
 templates.env.filters["from_json"] = from_json_filter
+
+
+def _render_stream(name: str, context: dict, chunk_size: int = 16384):
+    """Render a template incrementally, yielding encoded chunks of about chunk_size bytes."""
+    buffer = []
+    size = 0
+    for piece in template_env.get_template(name).generate(context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
 settings_auth = HTTPBasic(auto_error=False)
 
 
-def parse_optional_float(value: Optional[str]) -> Optional[float]:
-    if value is None:
-        return None
-    cleaned = value.strip()
-    if cleaned == "":
-        return None
-    try:
-        return float(cleaned)
-    except ValueError:
+def _blank_to_none(value):
+    # The filter form submits empty inputs as "min_price=".
+    if isinstance(value, str) and not value.strip():
         return None
+    return value
+
+
+PriceParam = Annotated[Optional[NonNegativeFloat], BeforeValidator(_blank_to_none), Query()]
+
+
+_SETTINGS_PASSWORD_BYTES = SETTINGS_PASSWORD.encode() if SETTINGS_PASSWORD else None
 
 
 def require_settings_auth(credentials: Optional[HTTPBasicCredentials] = Depends(settings_auth)) -> None:
     """Protect settings UI and APIs when SETTINGS_PASSWORD is configured."""
-    if not SETTINGS_PASSWORD:
+    if _SETTINGS_PASSWORD_BYTES is None:
         return
 
-    if not credentials or not secrets.compare_digest(credentials.password, SETTINGS_PASSWORD):
+    if credentials is None or not secrets.compare_digest(credentials.password.encode(), _SETTINGS_PASSWORD_BYTES):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Settings authentication required",
@@ -81,30 +121,76 @@ def require_settings_auth(credentials: Optional[HTTPBasicCredentials] = Depends(
         )
 
 
+SORT_ALIASES = {
+    "last_seen": "last_seen_desc",
+    "newest": "first_seen_desc",
+    "oldest": "first_seen_asc",
+    "price_drop": "price_drop_desc",
+}
+
+SORTABLE_COLUMNS = {
+    "title": ("title_asc", "title_desc"),
+    "price": ("price_asc", "price_desc"),
+    "change": ("price_drop_asc", "price_drop_desc"),
+    "brand": ("brand_asc", "brand_desc"),
+    "model": ("model_asc", "model_desc"),
+    "first_seen": ("first_seen_asc", "first_seen_desc"),
+}
+
+
+@lru_cache(maxsize=512)
+def _build_sort_links(query_string: str, current_sort: str) -> tuple[dict, dict]:
+    """Column header links and arrows for the listings table.
+
+    Cached on the raw query string; the returned dicts are shared, so
+    treat them as read-only.
+    """
+    sort_urls = {}
+    sort_icons = {}
+    # Only sort_by differs between the links, so encode everything else once.
+    base = urlencode([
+        (key, value)
+        for key, value in parse_qsl(query_string, keep_blank_values=True)
+        if key != "sort_by"
+    ])
+    prefix = f"/?{base}&sort_by=" if base else "/?sort_by="
+
+    for column, (asc_key, desc_key) in SORTABLE_COLUMNS.items():
+        next_key = desc_key if current_sort == asc_key else asc_key
+        sort_urls[column] = prefix + next_key
+        if current_sort == asc_key:
+            sort_icons[column] = "↑"
+        elif current_sort == desc_key:
+            sort_icons[column] = "↓"
+        else:
+            sort_icons[column] = ""
+    return sort_urls, sort_icons
+
+
 # ── Page Routes ────────────────────────────────────────────────
 
+# The listing columns index.html renders; the rest (description above all)
+# is left in the table instead of being read for every row.
+_INDEX_LISTING_COLUMNS = (
+    "kijiji_id", "source", "title", "brand", "model", "first_seen", "image_urls",
+    "is_active", "is_hidden", "is_starred", "current_price", "original_price",
+    "nominal_price", "on_sale", "currency",
+)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, brand: Optional[str] = None, model: Optional[str] = None,
-                min_price: Optional[str] = None, max_price: Optional[str] = None,
+                min_price: PriceParam = None, max_price: PriceParam = None,
                 search: Optional[str] = None,
                 active_only: str = "1", show_hidden: str = "0",
                 starred_only: str = "0", sort_by: str = "last_seen"):
-    sort_aliases = {
-        "last_seen": "last_seen_desc",
-        "newest": "first_seen_desc",
-        "oldest": "first_seen_asc",
-        "price_drop": "price_drop_desc",
-    }
-    current_sort = sort_aliases.get(sort_by, sort_by)
-
-    min_price_value = parse_optional_float(min_price)
-    max_price_value = parse_optional_float(max_price)
+    current_sort = SORT_ALIASES.get(sort_by, sort_by)
 
     filters = {
         "brand": brand,
         "model": model,
-        "min_price": min_price_value,
-        "max_price": max_price_value,
+        "min_price": min_price,
+        "max_price": max_price,
         "search": search,
         "active_only": active_only == "1",
         "show_hidden": show_hidden == "1",
@@ -112,88 +198,71 @@ async def index(request: Request, brand: Optional[str] = None, model: Optional[s
         "sort_by": current_sort,
     }
 
-    sortable_columns = {
-        "title": ("title_asc", "title_desc"),
-        "price": ("price_asc", "price_desc"),
-        "change": ("price_drop_asc", "price_drop_desc"),
-        "brand": ("brand_asc", "brand_desc"),
-        "model": ("model_asc", "model_desc"),
-        "first_seen": ("first_seen_asc", "first_seen_desc"),
-    }
-    sort_urls = {}
-    sort_icons = {}
-    current_params = dict(request.query_params)
-
-    for column, (asc_key, desc_key) in sortable_columns.items():
-        next_key = desc_key if current_sort == asc_key else asc_key
-        params = dict(current_params)
-        params["sort_by"] = next_key
-        sort_urls[column] = f"/?{urlencode(params)}"
-        if current_sort == asc_key:
-            sort_icons[column] = "↑"
-        elif current_sort == desc_key:
-            sort_icons[column] = "↓"
-        else:
-            sort_icons[column] = ""
-
-    listings = db.get_listings(filters)
-    brands = db.get_distinct_brands()
-    models = db.get_distinct_models()
-    stats = db.get_stats()
-    sched_status = scheduler.get_status()
-    return templates.TemplateResponse("index.html", {
+    sort_urls, sort_icons = _build_sort_links(request.url.query, current_sort)
+
+    listings = await run_in_threadpool(db.get_listings, filters, columns=_INDEX_LISTING_COLUMNS)
+    brands = await run_in_threadpool(db.get_distinct_brands)
+    models = await run_in_threadpool(db.get_distinct_models)
+    stats = await run_in_threadpool(db.get_stats)
+    sched_status = await run_in_threadpool(scheduler.get_status)
+    # The listings table can run to thousands of rows; stream the page so
+    # the browser starts on the header while the rows are still rendering.
+    # The 200 status goes out with the first chunk, so a template error
+    # part-way through shows up as a truncated page plus a logged
+    # traceback rather than a 500.
+    return StreamingResponse(_render_stream("index.html", {
         "request": request, "listings": listings, "brands": brands, "models": models,
         "filters": filters, "stats": stats, "scheduler": sched_status,
         "sort_urls": sort_urls, "sort_icons": sort_icons,
-    })
+    }), media_type="text/html")
 
 
 @app.get("/listing/{kijiji_id}", response_class=HTMLResponse)
 async def listing_detail(request: Request, kijiji_id: str):
-    listing = db.get_listing(kijiji_id)
+    listing = await run_in_threadpool(db.get_listing, kijiji_id)
     if not listing:
         return HTMLResponse("Listing not found", status_code=404)
-    price_history = db.get_price_history(kijiji_id)
+    price_history = await run_in_threadpool(db.get_price_history, kijiji_id)
     return templates.TemplateResponse("listing.html", {
         "request": request, "listing": listing, "price_history": price_history,
     })
 
 
 @app.post("/listing/{kijiji_id}/hide")
-async def hide_listing(request: Request, kijiji_id: str):
+def hide_listing(request: Request, kijiji_id: str):
     db.set_listing_hidden(kijiji_id, True)
     return RedirectResponse(url=request.headers.get("referer", "/"), status_code=303)
 
 
 @app.post("/listing/{kijiji_id}/unhide")
-async def unhide_listing(request: Request, kijiji_id: str):
+def unhide_listing(request: Request, kijiji_id: str):
     db.set_listing_hidden(kijiji_id, False)
     return RedirectResponse(url=request.headers.get("referer", "/"), status_code=303)
 
 
 @app.post("/api/listing/{kijiji_id}/hide")
-async def api_hide_listing(kijiji_id: str):
+def api_hide_listing(kijiji_id: str):
     """JSON endpoint for hiding listing without page refresh."""
     db.set_listing_hidden(kijiji_id, True)
     return {"ok": True, "kijiji_id": kijiji_id, "is_hidden": True}
 
 
 @app.post("/api/listing/{kijiji_id}/unhide")
-async def api_unhide_listing(kijiji_id: str):
+def api_unhide_listing(kijiji_id: str):
     """JSON endpoint for unhiding listing without page refresh."""
     db.set_listing_hidden(kijiji_id, False)
     return {"ok": True, "kijiji_id": kijiji_id, "is_hidden": False}
 
 
 @app.post("/api/listing/{kijiji_id}/star")
-async def api_star_listing(kijiji_id: str):
+def api_star_listing(kijiji_id: str):
     """JSON endpoint for starring listing without page refresh."""
     db.set_listing_starred(kijiji_id, True)
     return {"ok": True, "kijiji_id": kijiji_id, "is_starred": True}
 
 
 @app.post("/api/listing/{kijiji_id}/unstar")
-async def api_unstar_listing(kijiji_id: str):
+def api_unstar_listing(kijiji_id: str):
     """JSON endpoint for unstarring listing without page refresh."""
     db.set_listing_starred(kijiji_id, False)
     return {"ok": True, "kijiji_id": kijiji_id, "is_starred": False}
@@ -205,7 +274,7 @@ class ListingMetadataUpdate(BaseModel):
 
 
 @app.put("/api/listing/{kijiji_id}/metadata")
-async def api_update_listing_metadata(kijiji_id: str, data: ListingMetadataUpdate):
+def api_update_listing_metadata(kijiji_id: str, data: ListingMetadataUpdate):
     if data.brand is None and data.model is None:
         raise HTTPException(status_code=400, detail="At least one field is required")
 
@@ -216,6 +285,7 @@ async def api_update_listing_metadata(kijiji_id: str, data: ListingMetadataUpdat
     brand = data.brand if data.brand is not None else listing.get("brand")
     model = data.model if data.model is not None else listing.get("model")
     db.update_listing_brand_model(kijiji_id, brand, model)
+    db.clear_read_caches()
     updated = db.get_listing(kijiji_id)
     return {
         "ok": True,
@@ -232,28 +302,20 @@ class BulkHideRequest(BaseModel):
 
 
 @app.post("/api/listings/bulk-hide")
-async def api_bulk_hide(data: BulkHideRequest):
+def api_bulk_hide(data: BulkHideRequest):
     """Bulk hide/unhide multiple listings."""
-    conn = db.get_conn()
-    try:
-        for kijiji_id in data.kijiji_ids:
-            db.set_listing_hidden(kijiji_id, data.hide, conn)
-        conn.commit()
-        return {
-            "ok": True,
-            "count": len(data.kijiji_ids),
-            "is_hidden": data.hide
-        }
-    except Exception as e:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    db.set_listings_hidden(data.kijiji_ids, data.hide)
+    return {
+        "ok": True,
+        "count": len(data.kijiji_ids),
+        "is_hidden": data.hide
+    }
 
 
 @app.delete("/api/listing/{kijiji_id}")
-async def api_delete_listing(kijiji_id: str):
+def api_delete_listing(kijiji_id: str):
     deleted = db.delete_listing(kijiji_id)
+    db.clear_read_caches()
     return {"ok": deleted, "kijiji_id": kijiji_id}
 
 
@@ -262,30 +324,39 @@ class BulkDeleteRequest(BaseModel):
 
 
 @app.post("/api/listings/bulk-delete")
-async def api_bulk_delete(data: BulkDeleteRequest):
-    conn = db.get_conn()
-    try:
-        deleted = db.delete_listings(data.kijiji_ids, conn=conn)
-        conn.commit()
-        return {"ok": True, "deleted": deleted}
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+def api_bulk_delete(data: BulkDeleteRequest):
+    deleted = db.delete_listings(data.kijiji_ids)
+    db.clear_read_caches()
+    return {"ok": True, "deleted": deleted}
+
+
+# Rendered deals page keyed on (data generation, UTC date); the date is
+# part of the key because the page shows days on market.
+_deals_cache: dict = {"key": None, "etag": None, "html": None}
+
+
+def _render_deals(request: Request) -> tuple[str, str]:
+    key = (db.get_data_generation(), datetime.now(timezone.utc).date().isoformat())
+    if _deals_cache["key"] != key:
+        deal_list = compute_deals(db.get_deal_candidates())
+        html = template_env.get_template("deals.html").render({
+            "request": request, "deals": deal_list,
+        })
+        _deals_cache.update(key=key, etag=f'"deals-{key[0]}-{key[1]}"', html=html)
+    return _deals_cache["etag"], _deals_cache["html"]
 
 
 @app.get("/deals", response_class=HTMLResponse)
 async def deals_page(request: Request):
-    listings = db.get_listings({"active_only": True})
-    deal_list = compute_deals(listings)
-    return templates.TemplateResponse("deals.html", {
-        "request": request, "deals": deal_list,
-    })
+    etag, html = await run_in_threadpool(_render_deals, request)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(html, headers=headers)
 
 
 @app.get("/settings", response_class=HTMLResponse)
-async def settings_page(request: Request, _: None = Depends(require_settings_auth)):
+def settings_page(request: Request, _: None = Depends(require_settings_auth)):
     settings = db.get_all_settings()
     queries = db.get_search_queries()
     brands = db.get_brand_keywords()
@@ -299,19 +370,30 @@ async def settings_page(request: Request, _: None = Depends(require_settings_aut
 
 # ── API: Price History ─────────────────────────────────────────
 
+@lru_cache(maxsize=1024)
+def _price_history_payload(kijiji_id: str, generation: int) -> bytes:
+    """Serialized chart data; generation is only part of the cache key."""
+    dates, prices = db.get_price_history_compact(kijiji_id)
+    return orjson.dumps({"dates": dates, "prices": prices})
+
+
 @app.get("/api/price-history/{kijiji_id}")
-async def api_price_history(kijiji_id: str):
-    history = db.get_price_history(kijiji_id)
-    return {
-        "dates": [h["scraped_at"][:10] for h in history],
-        "prices": [h["price"] for h in history],
-    }
+async def api_price_history(request: Request, kijiji_id: str):
+    def load():
+        generation = db.get_data_generation()
+        return generation, _price_history_payload(kijiji_id, generation)
+
+    generation, body = await run_in_threadpool(load)
+    etag = f'"{kijiji_id}-{generation}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
 
 
 # ── API: Settings ─────────────────────────────────────────────
 
 @app.get("/api/settings")
-async def api_get_settings(_: None = Depends(require_settings_auth)):
+def api_get_settings(_: None = Depends(require_settings_auth)):
     return db.get_all_settings()
 
 
@@ -340,7 +422,7 @@ class WebhookTestRequest(BaseModel):
 
 
 @app.put("/api/settings")
-async def api_update_settings(data: SettingsUpdate, _: None = Depends(require_settings_auth)):
+def api_update_settings(data: SettingsUpdate, _: None = Depends(require_settings_auth)):
     updated = {}
     for key, value in data.model_dump(exclude_none=True).items():
         db.set_setting(key, value)
@@ -353,7 +435,7 @@ async def api_update_settings(data: SettingsUpdate, _: None = Depends(require_se
 
 
 @app.post("/api/settings/webhook-test")
-async def api_webhook_test(data: WebhookTestRequest, _: None = Depends(require_settings_auth)):
+def api_webhook_test(data: WebhookTestRequest, _: None = Depends(require_settings_auth)):
     settings = db.get_all_settings()
     if data.webhook_url is not None:
         settings["webhook_url"] = data.webhook_url
@@ -368,22 +450,20 @@ async def api_webhook_test(data: WebhookTestRequest, _: None = Depends(require_s
 
 
 @app.post("/api/settings/clear-db")
-async def api_clear_db(data: ClearDbRequest, _: None = Depends(require_settings_auth)):
+def api_clear_db(data: ClearDbRequest, _: None = Depends(require_settings_auth)):
     result = db.clear_database(preserve_settings=data.preserve_settings)
+    db.clear_read_caches()
     return {"ok": True, **result}
 
 
 @app.get("/api/settings/export")
-async def api_export_data(data_type: str = "all"):
+def api_export_data(data_type: str = "all"):
     """Export app data as JSON (open endpoint)."""
-    from fastapi.responses import JSONResponse
-    from datetime import datetime
-    
     data = db.export_app_data(data_type=data_type)
     date_str = datetime.now().strftime("%Y-%m-%d")
     filename = f"3dp_tracker_export_{data_type}_{date_str}.json"
     
-    return JSONResponse(
+    return ORJSONResponse(
         content=data,
         headers={
             "Content-Disposition": f"attachment; filename={filename}"
@@ -407,9 +487,10 @@ async def api_import_data(
     
     try:
         content = await file.read()
-        data = json.loads(content)
-        result = db.import_app_data(
-            data, 
+        data = orjson.loads(content)
+        result = await run_in_threadpool(
+            db.import_app_data,
+            data,
             data_type=data_type, 
             clear_existing=clear_existing, 
             overwrite=overwrite
@@ -424,7 +505,7 @@ async def api_import_data(
 # ── API: Search Queries ────────────────────────────────────────
 
 @app.get("/api/search-queries")
-async def api_list_queries(_: None = Depends(require_settings_auth)):
+def api_list_queries(_: None = Depends(require_settings_auth)):
     return db.get_search_queries()
 
 
@@ -434,7 +515,7 @@ class SearchQueryCreate(BaseModel):
 
 
 @app.post("/api/search-queries")
-async def api_add_query(data: SearchQueryCreate, _: None = Depends(require_settings_auth)):
+def api_add_query(data: SearchQueryCreate, _: None = Depends(require_settings_auth)):
     qid = db.add_search_query(data.url, data.label)
     return {"id": qid, "url": data.url, "label": data.label, "enabled": 1}
 
@@ -446,20 +527,20 @@ class SearchQueryUpdate(BaseModel):
 
 
 @app.put("/api/search-queries/{query_id}")
-async def api_update_query(query_id: int, data: SearchQueryUpdate, _: None = Depends(require_settings_auth)):
+def api_update_query(query_id: int, data: SearchQueryUpdate, _: None = Depends(require_settings_auth)):
     db.update_search_query(query_id, url=data.url, label=data.label, enabled=data.enabled)
     return {"ok": True}
 
 
 @app.delete("/api/search-queries/{query_id}")
-async def api_delete_query(query_id: int, _: None = Depends(require_settings_auth)):
+def api_delete_query(query_id: int, _: None = Depends(require_settings_auth)):
     db.delete_search_query(query_id)
     return {"ok": True}
 
 
 @app.post("/api/search-queries/{query_id}/scrape")
-async def api_scrape_query(query_id: int, _: None = Depends(require_settings_auth)):
-    query = next((q for q in db.get_search_queries() if q["id"] == query_id), None)
+def api_scrape_query(query_id: int, _: None = Depends(require_settings_auth)):
+    query = db.get_search_query(query_id)
     if not query:
         raise HTTPException(status_code=404, detail="Search query not found")
     result = scheduler.trigger_query(query_id)
@@ -471,7 +552,7 @@ async def api_scrape_query(query_id: int, _: None = Depends(require_settings_aut
 # ── API: Brand Keywords ───────────────────────────────────────
 
 @app.get("/api/brands")
-async def api_list_brands(_: None = Depends(require_settings_auth)):
+def api_list_brands(_: None = Depends(require_settings_auth)):
     return db.get_brand_keywords()
 
 
@@ -481,13 +562,13 @@ class BrandKeywordCreate(BaseModel):
 
 
 @app.post("/api/brands")
-async def api_add_brand(data: BrandKeywordCreate, _: None = Depends(require_settings_auth)):
+def api_add_brand(data: BrandKeywordCreate, _: None = Depends(require_settings_auth)):
     kid = db.add_brand_keyword(data.brand, data.keyword)
     return {"id": kid, "brand": data.brand, "keyword": data.keyword}
 
 
 @app.delete("/api/brands/{keyword_id}")
-async def api_delete_brand(keyword_id: int, _: None = Depends(require_settings_auth)):
+def api_delete_brand(keyword_id: int, _: None = Depends(require_settings_auth)):
     db.delete_brand_keyword(keyword_id)
     return {"ok": True}
 
@@ -495,7 +576,7 @@ async def api_delete_brand(keyword_id: int, _: None = Depends(require_settings_a
 # ── API: MSRP ─────────────────────────────────────────────────
 
 @app.get("/api/msrp")
-async def api_list_msrp(_: None = Depends(require_settings_auth)):
+def api_list_msrp(_: None = Depends(require_settings_auth)):
     return db.get_msrp_entries()
 
 
@@ -507,13 +588,13 @@ class MsrpCreate(BaseModel):
 
 
 @app.post("/api/msrp")
-async def api_upsert_msrp(data: MsrpCreate, _: None = Depends(require_settings_auth)):
+def api_upsert_msrp(data: MsrpCreate, _: None = Depends(require_settings_auth)):
     eid = db.upsert_msrp_entry(data.brand, data.model, data.msrp_cad, data.msrp_usd)
     return {"id": eid, "brand": data.brand, "model": data.model, "msrp_cad": data.msrp_cad}
 
 
 @app.delete("/api/msrp/{entry_id}")
-async def api_delete_msrp(entry_id: int, _: None = Depends(require_settings_auth)):
+def api_delete_msrp(entry_id: int, _: None = Depends(require_settings_auth)):
     db.delete_msrp_entry(entry_id)
     return {"ok": True}
 
@@ -521,23 +602,23 @@ async def api_delete_msrp(entry_id: int, _: None = Depends(require_settings_auth
 # ── API: Scheduler ─────────────────────────────────────────────
 
 @app.get("/api/scheduler/status")
-async def api_scheduler_status():
+def api_scheduler_status():
     return scheduler.get_status()
 
 
 @app.post("/api/scheduler/start")
-async def api_scheduler_start():
+def api_scheduler_start():
     interval = db.get_setting("scrape_interval_hours", 6)
     scheduler.start_scheduler(interval)
     return scheduler.get_status()
 
 
 @app.post("/api/scheduler/stop")
-async def api_scheduler_stop():
+def api_scheduler_stop():
     scheduler.stop_scheduler()
     return scheduler.get_status()
 
 
 @app.post("/api/scheduler/trigger")
-async def api_scheduler_trigger():
+def api_scheduler_trigger():
     return scheduler.trigger_now()
@@ -7,9 +7,29 @@ Fetches current MSRP and retail sale prices from auroratechchannel.com.
 """
 
 import logging
+import re
+import time
+from typing import Optional
+from urllib.parse import unquote_plus
+
+import requests
+from lxml import etree, html as lxml_html
+
+from scraper import make_session
 
 logger = logging.getLogger(__name__)
 
+# Characters stripped from a price before float(): currency sign, thousands
+# separators and whitespace.
+_PRICE_STRIP = str.maketrans('', '', '$, \t\n\r\f\v\xa0')
+# Consecutive prices like $1,999.00$1,499.00 (MSRP, then current).
+_PRICE_PAIR_RE = re.compile(r'\$([\d,]+(?:\.\d{2})?)\s*\$([\d,]+(?:\.\d{2})?)')
+# Query parameters of a price-details.php link, matched in either order.
+_BRAND_PARAM_RE = re.compile(r'[?&]brand=([^&#]*)')
+_MODEL_PARAM_RE = re.compile(r'[?&]model=([^&#]*)')
+_ENDER3_RE = re.compile(r'Ender-3')
+_ENDER5_RE = re.compile(r'Ender-5')
+
 
 def update_retail_prices_from_aurora(delay: float = 1.0, usd_to_cad_rate: float = 1.35):
     """
@@ -32,26 +52,37 @@ if __name__ == "__main__":
     logger.info("Please update msrp_data.json manually for now")
 
 
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Shared by every AuroraScraper in the process so repeat fetches reuse the
+# open TLS connection.
+_SESSION = make_session()
+
+
 class AuroraScraper:
     """Scrapes 3D printer pricing data from Aurora Tech Channel."""
     
     BASE_URL = "https://auroratechchannel.com"
     PRICE_TRACKER_URL = f"{BASE_URL}/3d-printer-price.php"
     
+    # Seconds a scraped price page is reused before fetching it again.
+    CACHE_TTL = 300
+    
     def __init__(self, session: Optional[requests.Session] = None):
-        self.session = session or requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        })
+        self._cache: Optional[tuple[float, dict]] = None
+        # Validators from the last successful fetch, sent back as a
+        # conditional request once the TTL runs out.
+        self._last_etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self.session = session or _SESSION
+        self.session.headers.update({"User-Agent": USER_AGENT})
     
     def _parse_price(self, price_text: str) -> Optional[float]:
         """Extract numeric price from text like '$1,999.00'."""
         if not price_text:
             return None
-        # Remove currency symbols, commas, and whitespace
-        cleaned = re.sub(r'[$,\s]', '', price_text)
         try:
-            return float(cleaned)
+            return float(price_text.translate(_PRICE_STRIP))
         except (ValueError, TypeError):
             return None
     
@@ -60,8 +91,8 @@ class AuroraScraper:
         if not model:
             return model
         # Standardize hyphens in common patterns
-        model = re.sub(r'Ender-3', 'Ender 3', model)
-        model = re.sub(r'Ender-5', 'Ender 5', model)
+        model = _ENDER3_RE.sub('Ender 3', model)
+        model = _ENDER5_RE.sub('Ender 5', model)
         return model
     
     def _extract_brand_model(self, link_element) -> tuple[Optional[str], Optional[str]]:
@@ -70,12 +101,12 @@ class AuroraScraper:
         if 'price-details.php' not in href:
             return None, None
         
-        # Parse query parameters
-        parsed = urlparse(href)
-        params = parse_qs(parsed.query)
-        
-        brand = params.get('brand', [None])[0]
-        model = params.get('model', [None])[0]
+        # Pull the two parameters straight out of the href; only the matched
+        # slices get decoded, same as parse_qs would do.
+        m = _BRAND_PARAM_RE.search(href)
+        brand = unquote_plus(m.group(1)) if m and m.group(1) else None
+        m = _MODEL_PARAM_RE.search(href)
+        model = unquote_plus(m.group(1)) if m and m.group(1) else None
         
         # Normalize model name
         if model:
@@ -90,21 +121,48 @@ class AuroraScraper:
         Returns:
             List of dicts with keys: brand, model, msrp, current_price, price_drop, drop_percentage
         """
+        return list(self._price_index().values())
+    
+    def _price_index(self) -> dict:
+        """Scraped prices keyed by (brand, model) lowercased, cached for CACHE_TTL seconds."""
+        if self._cache and time.monotonic() - self._cache[0] < self.CACHE_TTL:
+            return self._cache[1]
+        
         logger.info("Fetching Aurora Tech Channel FDM printer prices...")
         
+        headers = {}
+        if self._cache:
+            if self._last_etag:
+                headers['If-None-Match'] = self._last_etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        
         try:
-            response = self.session.get(self.PRICE_TRACKER_URL, timeout=30)
+            response = self.session.get(self.PRICE_TRACKER_URL, headers=headers, timeout=30)
             response.raise_for_status()
         except requests.RequestException as e:
             logger.error(f"Failed to fetch Aurora price page: {e}")
-            return []
+            # Stale prices beat none; the next call past the TTL retries.
+            return self._cache[1] if self._cache else {}
+        
+        if response.status_code == 304 and self._cache:
+            logger.info("Aurora price page not modified, reusing previous prices")
+            self._cache = (time.monotonic(), self._cache[1])
+            return self._cache[1]
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # lxml reads the raw bytes and honours the page's declared charset,
+        # so response.text never has to decode (or charset-sniff) the page.
+        try:
+            tree = lxml_html.fromstring(response.content)
+        except etree.ParserError as e:
+            # An empty or comment-only body has no document to parse.
+            logger.error(f"Failed to parse Aurora price page: {e}")
+            return self._cache[1] if self._cache else {}
         results = []
         
         # Find all price drop entries - they're in a specific section
         # The structure shows recent price drops with brand/model info
-        price_items = soup.find_all('a', href=re.compile(r'price-details\.php'))
+        price_items = tree.xpath("//a[contains(@href, 'price-details.php')]")
         
         seen = set()  # Track unique brand/model combinations
         
@@ -114,27 +172,25 @@ class AuroraScraper:
                 if not brand or not model:
                     continue
                 
-                # Create unique key
-                key = (brand.lower() if brand else '', model.lower() if model else '')
+                # Dedup before touching the row's text: the same model is
+                # often linked from several widgets on the page.
+                key = (brand.lower(), model.lower())
                 if key in seen:
                     continue
                 seen.add(key)
                 
                 # Find the immediate parent that contains just this item's prices
-                # Look for the closest wrapper div/container
-                container = link.find_parent()
-                if not container:
+                container = link.getparent()
+                if container is None:
                     continue
                 
-                # Get text from just the direct siblings, not nested elements
+                # Get text from just the bare text nodes after it, not nested elements
                 # The format on Aurora is: BrandModel $MSRP$CurrentPrice
-                siblings_text = ''.join([str(s) for s in container.next_siblings if isinstance(s, str)])
-                price_text = link.get_text() + siblings_text
+                siblings_text = ''.join(container.xpath('following-sibling::text()'))
+                price_text = link.text_content() + siblings_text
                 
-                # More specific pattern: consecutive prices like $1,999.00$1,499.00
-                # Use a tighter pattern to avoid picking up unrelated prices
-                price_pattern = r'\$([\d,]+(?:\.\d{2})?)\s*\$([\d,]+(?:\.\d{2})?)'  
-                match = re.search(price_pattern, price_text)
+                # Tight pattern to avoid picking up unrelated prices
+                match = _PRICE_PAIR_RE.search(price_text)
                 
                 if match:
                     msrp = self._parse_price(match.group(1))
@@ -160,7 +216,11 @@ class AuroraScraper:
                 continue
         
         logger.info(f"Scraped {len(results)} printer prices from Aurora Tech Channel")
-        return results
+        index = {(item['brand'].lower(), item['model'].lower()): item for item in results}
+        self._cache = (time.monotonic(), index)
+        self._last_etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+        return index
     
     def get_price_for_model(self, brand: str, model: str) -> Optional[dict]:
         """
@@ -173,24 +233,18 @@ class AuroraScraper:
         Returns:
             Dict with msrp_usd and current_price_usd, or None if not found
         """
-        all_prices = self.scrape_fdm_prices()
-        
-        brand_lower = brand.lower()
-        model_normalized = self._normalize_model_name(model).lower()
-        
-        for item in all_prices:
-            if (item['brand'].lower() == brand_lower and 
-                self._normalize_model_name(item['model']).lower() == model_normalized):
-                return {
-                    'brand': item['brand'],
-                    'model': item['model'],
-                    'msrp_usd': item['msrp_usd'],
-                    'current_price_usd': item['current_price_usd'],
-                    'price_drop': item['price_drop'],
-                    'drop_percentage': item['drop_percentage']
-                }
-        
-        return None
+        # Scraped models are already normalized, so the index keys match.
+        item = self._price_index().get((brand.lower(), self._normalize_model_name(model).lower()))
+        if item is None:
+            return None
+        return {
+            'brand': item['brand'],
+            'model': item['model'],
+            'msrp_usd': item['msrp_usd'],
+            'current_price_usd': item['current_price_usd'],
+            'price_drop': item['price_drop'],
+            'drop_percentage': item['drop_percentage']
+        }
 
 
 def update_retail_prices_from_aurora(delay: float = 1.0, usd_to_cad_rate: float = 1.35):
@@ -214,50 +268,25 @@ def update_retail_prices_from_aurora(delay: float = 1.0, usd_to_cad_rate: float
         logger.warning("No prices retrieved from Aurora Tech Channel")
         return
     
-    conn = db.get_conn()
-    updated = 0
-    skipped = 0
+    # Convert USD prices to CAD. msrp_cad only applies to models we don't
+    # have yet; existing entries keep their CAD MSRP.
+    entries = [
+        (
+            item['brand'],
+            item['model'],
+            item['msrp_usd'] * usd_to_cad_rate,
+            item['msrp_usd'],
+            item['current_price_usd'] * usd_to_cad_rate,
+        )
+        for item in prices
+    ]
     
+    conn = db.get_conn()
     try:
-        for item in prices:
-            # Convert USD prices to CAD
-            msrp_usd = item['msrp_usd']
-            retail_price_usd = item['current_price_usd']
-            retail_price_cad = retail_price_usd * usd_to_cad_rate
-            
-            # Check if entry exists - only update if we have it already
-            existing = conn.execute(
-                "SELECT msrp_cad, msrp_usd FROM msrp_entries WHERE brand = ? AND model = ?",
-                (item['brand'].lower(), item['model'])
-            ).fetchone()
-            
-            if existing:
-                # Update only retail price and msrp_usd, keep existing msrp_cad
-                db.upsert_msrp_entry(
-                    brand=item['brand'],
-                    model=item['model'],
-                    msrp_cad=existing['msrp_cad'],  # Keep existing CAD MSRP
-                    msrp_usd=msrp_usd,  # Update USD MSRP from Aurora
-                    retail_price=retail_price_cad,  # Current retail converted to CAD
-                    conn=conn
-                )
-                updated += 1
-            else:
-                # New entry - use Aurora USD price converted to CAD
-                db.upsert_msrp_entry(
-                    brand=item['brand'],
-                    model=item['model'],
-                    msrp_cad=msrp_usd * usd_to_cad_rate,  # Convert USD to CAD
-                    msrp_usd=msrp_usd,
-                    retail_price=retail_price_cad,
-                    conn=conn
-                )
-                updated += 1
-                logger.debug(f"Added new model: {item['brand']} {item['model']}")
-        
+        updated = db.upsert_retail_prices(entries, conn=conn)
         logger.info(f"Updated {updated} models from Aurora Tech Channel")
     finally:
-        conn.close()
+        db.close_conn(conn)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 """Quick script to check database MSRP entries."""
 
-import sqlite3
+import db
 
-conn = sqlite3.connect('listings.db')
-conn.row_factory = sqlite3.Row
+# Same connection setup as the app: DB_PATH plus the tuned pragmas.
+conn = db.get_conn()
 
 print("\nCreality entries:")
 print("=" * 80)
@@ -32,4 +32,4 @@ summary = conn.execute("""
 for row in summary:
     print(f"{row['brand']:15s}: {row['count']:3d} models")
 
-conn.close()
+db.close_conn(conn)
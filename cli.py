@@ -8,8 +8,6 @@ import sys
 import click
 
 import db
-from scheduler import run_scrape
-from tracker import compute_deals
 
 
 def _as_bool(value: str, default: bool = False) -> bool:
@@ -56,9 +54,13 @@ def cli(ctx, verbose):
 @cli.command()
 @click.option("--query", "-q", help="Run only a specific search query label")
 @click.option("--max-pages", default=None, type=int, help="Max pages per query (default: from settings)")
-def scrape(query, max_pages):
+@click.option("--concurrent", default=1, type=click.IntRange(min=1), show_default=True,
+              help="Number of search queries to fetch in parallel")
+def scrape(query, max_pages, concurrent):
     """Scrape Kijiji for 3D printer listings."""
-    result = run_scrape(max_pages=max_pages, query_filter=query)
+    from scheduler import run_scrape
+
+    result = run_scrape(max_pages=max_pages, query_filter=query, concurrency=concurrent)
 
     if "error" in result:
         click.echo(f"Error: {result['error']}")
@@ -72,26 +74,31 @@ def scrape(query, max_pages):
 @click.option("--limit", "-n", default=20, help="Number of deals to show")
 def deals(limit):
     """Show the best current deals."""
-    listings = db.get_listings({"active_only": True})
-    deal_list = compute_deals(listings)
+    from tracker import compute_deals
+
+    listings = db.get_deal_candidates()
+    deal_list = compute_deals(listings, limit=limit)
 
     if not deal_list:
         click.echo("No deals found. Run 'scrape' first, then run it again later to detect price drops.")
         return
 
-    click.echo(f"\nTop {min(limit, len(deal_list))} Deals:\n")
-    click.echo(f"{'Title':<50} {'Price':>8} {'Drop':>8} {'Drop%':>6} {'Days':>5} {'Brand':<10}")
-    click.echo("-" * 95)
-
-    for deal in deal_list[:limit]:
-        click.echo(
-            f"{deal.title[:49]:<50} "
-            f"${deal.current_price:>7.0f} "
-            f"${deal.price_drop_abs:>7.0f} "
-            f"{deal.price_drop_pct:>5.1f}% "
-            f"{deal.days_on_market:>5} "
-            f"{(deal.brand or ''):>10}"
-        )
+    lines = [
+        f"\nTop {len(deal_list)} Deals:\n",
+        f"{'Title':<50} {'Price':>8} {'Drop':>8} {'Drop%':>6} {'Days':>5} {'Brand':<10}",
+        "-" * 95,
+    ]
+    lines.extend(
+        f"{deal.title:<50.49} "
+        f"${deal.current_price:>7.0f} "
+        f"${deal.price_drop_abs:>7.0f} "
+        f"{deal.price_drop_pct:>5.1f}% "
+        f"{deal.days_on_market:>5} "
+        f"{(deal.brand or ''):>10}"
+        for deal in deal_list
+    )
+    # One write instead of a write + flush per row.
+    click.echo("\n".join(lines))
 
 
 @cli.command()
@@ -112,6 +119,13 @@ def stats():
                     f"Price changes: {run['price_changes']}")
 
 
+@cli.command()
+def vacuum():
+    """Compact the database file and rebuild the search index."""
+    db.vacuum_database()
+    click.echo("✓ Database vacuumed")
+
+
 @cli.command()
 @click.option("--port", default=DEFAULT_PORT, help="Port to serve on")
 @click.option("--host", default=DEFAULT_HOST, help="Host to bind to")
@@ -169,10 +183,11 @@ def export_data(out, data_type):
 def import_data(in_file, data_type, clear, overwrite):
     """Import search queries, brands, and/or MSRPs from a JSON file."""
     import json
+    import orjson
     click.echo(f"Reading data from {in_file}...")
     try:
-        with open(in_file, "r") as f:
-            data = json.load(f)
+        with open(in_file, "rb") as f:
+            data = orjson.loads(f.read())
         click.echo(f"Importing {data_type} (clear={clear}, overwrite={overwrite})...")
         result = db.import_app_data(data, data_type=data_type, clear_existing=clear, overwrite=overwrite)
         click.echo(f"✓ Import complete!")
@@ -6,22 +6,27 @@ These defaults are used for first-run seeding only.
 
 import os
 
+import orjson
+
 # Database path
 DB_PATH = os.environ.get("DB_PATH", "listings.db")
 
+# Directory for compiled Jinja2 template bytecode (speeds up cold starts).
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR", ".jinja_cache")
+
 # Optional HTTP Basic password that protects the Settings page and related APIs.
 # Leave unset/empty to disable protection.
 SETTINGS_PASSWORD = os.environ.get("SETTINGS_PASSWORD", "").strip()
 
 # User agents to rotate (not user-configurable, just a static list)
-USER_AGENTS = [
+USER_AGENTS = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-]
+)
 
 # ── Defaults for first-run DB seeding ──────────────────────────
 
@@ -45,6 +50,9 @@ DEFAULT_SETTINGS = {
     "webhook_deal_batch_size": 5,
 }
 
+# DEFAULT_SETTINGS as stored in the settings table, serialized once at import.
+DEFAULT_SETTINGS_JSON = {key: orjson.dumps(value).decode() for key, value in DEFAULT_SETTINGS.items()}
+
 DEFAULT_SEARCH_QUERIES = [
     {"url": "https://www.kijiji.ca/b-hamilton/3d-printer/k0l80014", "label": "3d printer"},
     {"url": "https://www.kijiji.ca/b-hamilton/3d-printing/k0l80014", "label": "3d printing"},
@@ -1,111 +1,359 @@
 """Database layer for the 3D Printer Kijiji Deal Tracker."""
 
-import json
+import atexit
+import contextlib
+import copy
+import functools
 import sqlite3
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 
-from config import DB_PATH, DEFAULT_BRAND_KEYWORDS, DEFAULT_SEARCH_QUERIES, DEFAULT_SETTINGS
+import orjson
 
+from config import DB_PATH, DEFAULT_BRAND_KEYWORDS, DEFAULT_SEARCH_QUERIES, DEFAULT_SETTINGS_JSON
 
-def get_conn(db_path: str = DB_PATH) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+
+def _dumps(value: Any) -> str:
+    """JSON-encode a value for a TEXT column (settings values, image_urls)."""
+    return orjson.dumps(value).decode()
+
+
+# Per-connection tuning. journal_mode=WAL is persisted in the database file
+# by init_db(); the rest only lives as long as the connection does.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    # Safe with WAL: a crash can only lose the last commit, never corrupt.
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+# sqlite3 keeps prepared statements per connection keyed by SQL text; the
+# default 128 slots are easily churned by get_listings' filter variants.
+_CACHED_STATEMENTS = 256
+
+
+def get_conn(db_path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread,
+                           cached_statements=_CACHED_STATEMENTS)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+# Long-lived connections, one per thread and database path. Opening a
+# connection and replaying the pragmas on every helper call dominated the
+# cost of the cheap queries behind each page load. The web handlers run on
+# a thread pool, so a per-thread connection is reused across requests
+# without ever being shared between two threads at once.
+_local = threading.local()
+_shared_lock = threading.Lock()
+_shared_conns: list[sqlite3.Connection] = []
+_shared_generation = 0
+
+
+def get_shared_conn(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Return this thread's long-lived connection, opening it on first use.
+
+    Callers must not close it; use close_shared_conns() at shutdown.
+    """
+    if getattr(_local, "generation", None) != _shared_generation:
+        _local.conns = {}
+        _local.generation = _shared_generation
+    conn = _local.conns.get(db_path)
+    if conn is None:
+        # Only ever used by this thread; disabling the check lets
+        # close_shared_conns() close it from whichever thread shuts down.
+        conn = get_conn(db_path, check_same_thread=False)
+        _local.conns[db_path] = conn
+        with _shared_lock:
+            _shared_conns.append(conn)
+    return conn
+
+
+def close_shared_conns():
+    """Close every connection handed out by get_shared_conn()."""
+    global _shared_generation
+    with _shared_lock:
+        conns = list(_shared_conns)
+        _shared_conns.clear()
+        _shared_generation += 1
+    for conn in conns:
+        try:
+            close_conn(conn)
+        except sqlite3.Error:
+            pass
+
+
+def close_thread_conns():
+    """Close the connections get_shared_conn() opened for the calling thread.
+
+    For short-lived threads, such as a manual scrape, whose connections
+    would otherwise stay open until close_shared_conns() at exit.
+    """
+    if getattr(_local, "generation", None) != _shared_generation:
+        return
+    conns = list(_local.conns.values())
+    _local.conns = {}
+    with _shared_lock:
+        # Skip any that close_shared_conns() has already taken.
+        conns = [conn for conn in conns if conn in _shared_conns]
+        for conn in conns:
+            _shared_conns.remove(conn)
+    for conn in conns:
+        try:
+            close_conn(conn)
+        except sqlite3.Error:
+            pass
+
+
+def close_conn(conn: sqlite3.Connection):
+    """Close a connection, first letting SQLite refresh any planner
+    statistics the connection's queries showed to be missing or stale."""
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+# The CLI has no lifespan hook like the web app, so also close at exit.
+atexit.register(close_shared_conns)
+
+
+# Connections currently inside a transaction() block; the helpers below
+# leave committing to that block instead of committing after each write.
+_transaction_conns: set[int] = set()
+
+
+@contextlib.contextmanager
+def transaction(conn: Optional[sqlite3.Connection] = None, immediate: bool = False):
+    """Run the enclosed writes as one transaction on ``conn``.
+
+    Commits on exit and rolls back on error. The write helpers skip their
+    own commits inside the block; nested blocks join the outer one. With
+    ``immediate``, the write lock is taken at BEGIN (waiting out the busy
+    timeout there) rather than at the first write inside the block.
+    """
+    if conn is None:
+        conn = get_shared_conn()
+    key = id(conn)
+    if key in _transaction_conns:
+        yield conn
+        return
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _transaction_conns.add(key)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _transaction_conns.discard(key)
+
+
+def _commit(conn: sqlite3.Connection):
+    if id(conn) not in _transaction_conns:
+        conn.commit()
+
+
+_initialized_paths: set[str] = set()
+_init_lock = threading.Lock()
+
+
 def init_db(db_path: str = DB_PATH):
+    """Create/migrate the schema and seed defaults, once per process per path.
+
+    `cli.py serve` initializes before handing off to uvicorn, whose lifespan
+    then calls this again in the same process.
+    """
+    with _init_lock:
+        if db_path in _initialized_paths:
+            return
+        _init_db(db_path)
+        _initialized_paths.add(db_path)
+
+
+def _init_db(db_path: str):
     conn = get_conn(db_path)
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS listings (
-            kijiji_id       TEXT PRIMARY KEY,
-            source          TEXT NOT NULL DEFAULT 'kijiji',
-            url             TEXT NOT NULL,
-            title           TEXT NOT NULL,
-            description     TEXT,
-            seller_name     TEXT,
-            location        TEXT,
-            image_urls      TEXT,
-            listing_date    TEXT,
-            first_seen      TEXT NOT NULL,
-            last_seen       TEXT NOT NULL,
-            is_active       INTEGER DEFAULT 1,
-            is_hidden       INTEGER DEFAULT 0,
-            is_starred      INTEGER DEFAULT 0,
-            missed_runs     INTEGER DEFAULT 0,
-            brand           TEXT,
-            model           TEXT,
-            msrp            REAL,
-            current_price   REAL,
-            original_price  REAL,
-            nominal_price   REAL,
-            on_sale         INTEGER DEFAULT 0,
-            currency        TEXT NOT NULL DEFAULT 'CAD'
-        );
-
-        CREATE TABLE IF NOT EXISTS price_snapshots (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            kijiji_id       TEXT NOT NULL REFERENCES listings(kijiji_id),
-            price           REAL,
-            scraped_at      TEXT NOT NULL,
-            UNIQUE(kijiji_id, scraped_at)
-        );
-
-        CREATE TABLE IF NOT EXISTS scrape_runs (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            started_at      TEXT NOT NULL,
-            finished_at     TEXT,
-            listings_found  INTEGER DEFAULT 0,
-            new_listings    INTEGER DEFAULT 0,
-            price_changes   INTEGER DEFAULT 0,
-            errors          INTEGER DEFAULT 0,
-            search_query    TEXT
-        );
-
-        CREATE TABLE IF NOT EXISTS settings (
-            key   TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS search_queries (
-            id      INTEGER PRIMARY KEY AUTOINCREMENT,
-            url     TEXT NOT NULL,
-            label   TEXT NOT NULL,
-            enabled INTEGER DEFAULT 1
-        );
-
-        CREATE TABLE IF NOT EXISTS brand_keywords (
-            id      INTEGER PRIMARY KEY AUTOINCREMENT,
-            brand   TEXT NOT NULL,
-            keyword TEXT NOT NULL,
-            UNIQUE(brand, keyword)
-        );
-
-        CREATE TABLE IF NOT EXISTS msrp_entries (
-            id            INTEGER PRIMARY KEY AUTOINCREMENT,
-            brand         TEXT NOT NULL,
-            model         TEXT NOT NULL,
-            msrp_cad      REAL NOT NULL,
-            msrp_usd      REAL,
-            retail_price  REAL,
-            last_updated  TEXT,
-            UNIQUE(brand, model)
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_snapshots_kijiji_id ON price_snapshots(kijiji_id);
-        CREATE INDEX IF NOT EXISTS idx_snapshots_scraped_at ON price_snapshots(scraped_at);
-        CREATE INDEX IF NOT EXISTS idx_listings_brand ON listings(brand);
-        CREATE INDEX IF NOT EXISTS idx_listings_active ON listings(is_active);
-        CREATE INDEX IF NOT EXISTS idx_listings_current_price ON listings(current_price);
-    """)
-    _ensure_schema_updates(conn)
-    conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    # An up-to-date database skips the DDL script and the migrations; only
+    # the seeding below, which backfills new defaults, runs every time.
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        conn.executescript(_SCHEMA_SQL)
+        _ensure_schema_updates(conn)
+        # After the schema updates, since is_hidden may have just been added.
+        conn.executescript(_VISIBLE_LISTING_INDEXES_SQL)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
 
     # Seed defaults if tables are empty
     _seed_defaults(conn)
-    conn.close()
+    close_conn(conn)
+
+
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS listings (
+        kijiji_id       TEXT PRIMARY KEY,
+        source          TEXT NOT NULL DEFAULT 'kijiji',
+        url             TEXT NOT NULL,
+        title           TEXT NOT NULL,
+        description     TEXT,
+        seller_name     TEXT,
+        location        TEXT,
+        image_urls      TEXT,
+        listing_date    TEXT,
+        first_seen      TEXT NOT NULL,
+        last_seen       TEXT NOT NULL,
+        is_active       INTEGER DEFAULT 1,
+        is_hidden       INTEGER DEFAULT 0,
+        is_starred      INTEGER DEFAULT 0,
+        missed_runs     INTEGER DEFAULT 0,
+        brand           TEXT,
+        model           TEXT,
+        msrp            REAL,
+        current_price   REAL,
+        original_price  REAL,
+        nominal_price   REAL,
+        on_sale         INTEGER DEFAULT 0,
+        currency        TEXT NOT NULL DEFAULT 'CAD'
+    );
+
+    CREATE TABLE IF NOT EXISTS price_snapshots (
+        id              INTEGER PRIMARY KEY AUTOINCREMENT,
+        kijiji_id       TEXT NOT NULL REFERENCES listings(kijiji_id),
+        price           REAL,
+        scraped_at      TEXT NOT NULL,
+        UNIQUE(kijiji_id, scraped_at)
+    );
+
+    CREATE TABLE IF NOT EXISTS scrape_runs (
+        id              INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at      TEXT NOT NULL,
+        finished_at     TEXT,
+        listings_found  INTEGER DEFAULT 0,
+        new_listings    INTEGER DEFAULT 0,
+        price_changes   INTEGER DEFAULT 0,
+        errors          INTEGER DEFAULT 0,
+        search_query    TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS settings (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+
+    -- Internal counters, kept out of the user-facing settings table.
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key   TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS search_queries (
+        id      INTEGER PRIMARY KEY AUTOINCREMENT,
+        url     TEXT NOT NULL,
+        label   TEXT NOT NULL,
+        enabled INTEGER DEFAULT 1
+    );
+
+    CREATE TABLE IF NOT EXISTS brand_keywords (
+        id      INTEGER PRIMARY KEY AUTOINCREMENT,
+        brand   TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        UNIQUE(brand, keyword)
+    );
+
+    CREATE TABLE IF NOT EXISTS msrp_entries (
+        id            INTEGER PRIMARY KEY AUTOINCREMENT,
+        brand         TEXT NOT NULL,
+        model         TEXT NOT NULL,
+        msrp_cad      REAL NOT NULL,
+        msrp_usd      REAL,
+        retail_price  REAL,
+        last_updated  TEXT,
+        UNIQUE(brand, model)
+    );
+
+    -- UNIQUE(brand, model) already indexes exact lookups and ON CONFLICT;
+    -- this one serves the case-insensitive model match for manual edits.
+    CREATE INDEX IF NOT EXISTS idx_msrp_brand_model_nocase ON msrp_entries(brand, LOWER(model));
+    CREATE INDEX IF NOT EXISTS idx_snapshots_kijiji_id ON price_snapshots(kijiji_id);
+    CREATE INDEX IF NOT EXISTS idx_snapshots_scraped_at ON price_snapshots(scraped_at);
+    CREATE INDEX IF NOT EXISTS idx_listings_brand ON listings(brand);
+    CREATE INDEX IF NOT EXISTS idx_listings_active ON listings(is_active);
+    CREATE INDEX IF NOT EXISTS idx_listings_current_price ON listings(current_price);
+    -- Index-only, already-ordered scans for the filter dropdowns.
+    CREATE INDEX IF NOT EXISTS idx_listings_active_brands ON listings(brand)
+        WHERE brand IS NOT NULL AND is_active = 1;
+    CREATE INDEX IF NOT EXISTS idx_listings_active_models ON listings(model)
+        WHERE model IS NOT NULL AND is_active = 1;
+    CREATE INDEX IF NOT EXISTS idx_listings_active_locations ON listings(location)
+        WHERE location IS NOT NULL AND is_active = 1;
+
+    -- Trigram full-text index over the searchable text, kept in sync by
+    -- the triggers below; get_listings uses it for substring search.
+    -- content_rowid is listings' implicit rowid (the key is the TEXT
+    -- kijiji_id), which VACUUM may renumber: use vacuum_database, which
+    -- rebuilds this index afterwards, rather than a bare VACUUM.
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+        title, description, location,
+        content='listings', content_rowid='rowid', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS listings_fts_ai AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END;
+    CREATE TRIGGER IF NOT EXISTS listings_fts_ad AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+    END;
+    -- UPDATE OF alone fires whenever a column is in the SET list, and the
+    -- scrape's listing UPDATEs always set title; only reindex real changes.
+    -- Dropped first so databases with the older trigger pick this one up.
+    DROP TRIGGER IF EXISTS listings_fts_au;
+    CREATE TRIGGER listings_fts_au
+    AFTER UPDATE OF title, description, location ON listings
+    WHEN old.title IS NOT new.title
+      OR old.description IS NOT new.description
+      OR old.location IS NOT new.location
+    BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+        INSERT INTO listings_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END;
+"""
+
+
+# Partial indexes over the visible listings (the dashboard's default filter
+# and the deal scan); SQLite uses them when a query's WHERE includes
+# is_active = 1 AND is_hidden = 0.
+_VISIBLE_LISTING_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_listings_deal_scan ON listings(last_seen)
+        WHERE is_active = 1 AND is_hidden = 0;
+    CREATE INDEX IF NOT EXISTS idx_listings_visible_price ON listings(current_price)
+        WHERE is_active = 1 AND is_hidden = 0;
+    CREATE INDEX IF NOT EXISTS idx_listings_visible_brand ON listings(brand, last_seen)
+        WHERE is_active = 1 AND is_hidden = 0;
+    -- Same expression as get_listings' price_drop sorts, so those read the
+    -- rows in order instead of computing and sorting the drop per request.
+    CREATE INDEX IF NOT EXISTS idx_listings_visible_price_drop
+        ON listings((COALESCE(original_price, 0) - COALESCE(current_price, 0)))
+        WHERE is_active = 1 AND is_hidden = 0;
+"""
+
+
+# Stored in PRAGMA user_version once _init_db has applied the schema, so
+# later starts skip it. Bump it when changing _SCHEMA_SQL, the visible
+# listing indexes, or the updates below.
+SCHEMA_VERSION = 5
 
 
 def _ensure_schema_updates(conn: sqlite3.Connection):
@@ -136,57 +384,45 @@ def _ensure_schema_updates(conn: sqlite3.Connection):
     conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_hidden ON listings(is_hidden)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_starred ON listings(is_starred)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_source ON listings(source)")
+    # Index listings that predate listings_fts and its triggers.
+    conn.execute("INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')")
+    # The data generation used to be stored as a setting; carry it over so
+    # caches keyed on it never see a reused value.
+    conn.execute(
+        """INSERT OR IGNORE INTO app_meta (key, value)
+           SELECT key, CAST(value AS INTEGER) FROM settings WHERE key = ?""",
+        (DATA_GENERATION_KEY,),
+    )
+    conn.execute("DELETE FROM settings WHERE key = ?", (DATA_GENERATION_KEY,))
 
 
 def _seed_defaults(conn: sqlite3.Connection):
     """Populate settings, search queries, brands, and MSRP on first run."""
-    # Settings
-    existing = conn.execute("SELECT COUNT(*) as c FROM settings").fetchone()["c"]
-    if existing == 0:
-        for key, value in DEFAULT_SETTINGS.items():
-            conn.execute(
-                "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
-                (key, json.dumps(value))
-            )
-    else:
-        # Backfill newly introduced defaults without overwriting user values.
-        for key, value in DEFAULT_SETTINGS.items():
-            conn.execute(
-                "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
-                (key, json.dumps(value))
-            )
+    # Settings: INSERT OR IGNORE seeds a fresh table and backfills newly
+    # introduced defaults without overwriting user values.
+    conn.executemany(
+        "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+        DEFAULT_SETTINGS_JSON.items(),
+    )
 
-    # Search queries
-    existing = conn.execute("SELECT COUNT(*) as c FROM search_queries").fetchone()["c"]
-    if existing == 0:
-        for q in DEFAULT_SEARCH_QUERIES:
-            conn.execute(
-                "INSERT INTO search_queries (url, label, enabled) VALUES (?, ?, 1)",
-                (q["url"], q["label"])
-            )
-    else:
-        # Add any newly introduced default queries without duplicating existing URLs.
-        existing_urls = {
-            row["url"]
-            for row in conn.execute("SELECT url FROM search_queries").fetchall()
-        }
-        for q in DEFAULT_SEARCH_QUERIES:
-            if q["url"] in existing_urls:
-                continue
-            conn.execute(
-                "INSERT INTO search_queries (url, label, enabled) VALUES (?, ?, 1)",
-                (q["url"], q["label"])
-            )
+    # Search queries: add any default whose URL isn't there yet (all of
+    # them on first run) without duplicating existing URLs.
+    existing_urls = {
+        row["url"]
+        for row in conn.execute("SELECT url FROM search_queries").fetchall()
+    }
+    conn.executemany(
+        "INSERT INTO search_queries (url, label, enabled) VALUES (?, ?, 1)",
+        [(q["url"], q["label"]) for q in DEFAULT_SEARCH_QUERIES if q["url"] not in existing_urls],
+    )
 
     # Brand keywords
     existing = conn.execute("SELECT COUNT(*) as c FROM brand_keywords").fetchone()["c"]
     if existing == 0:
-        for brand, keywords in DEFAULT_BRAND_KEYWORDS.items():
-            for kw in keywords:
-                conn.execute(
-                    "INSERT OR IGNORE INTO brand_keywords (brand, keyword) VALUES (?, ?)",
-                    (brand, kw)
-                )
+        conn.executemany(
+            "INSERT OR IGNORE INTO brand_keywords (brand, keyword) VALUES (?, ?)",
+            [(brand, kw) for brand, keywords in DEFAULT_BRAND_KEYWORDS.items() for kw in keywords],
+        )
 
     # MSRP entries from msrp_data.json
     existing = conn.execute("SELECT COUNT(*) as c FROM msrp_entries").fetchone()["c"]
@@ -194,91 +430,154 @@ def _seed_defaults(conn: sqlite3.Connection):
         import os
         msrp_path = os.path.join(os.path.dirname(__file__), "msrp_data.json")
         if os.path.exists(msrp_path):
-            with open(msrp_path) as f:
-                msrp_data = json.load(f)
-            for brand, models in msrp_data.items():
-                for model, prices in models.items():
-                    conn.execute(
-                        "INSERT OR IGNORE INTO msrp_entries (brand, model, msrp_cad, msrp_usd) VALUES (?, ?, ?, ?)",
-                        (brand, model, prices.get("msrp_cad", 0), prices.get("msrp_usd"))
-                    )
+            with open(msrp_path, "rb") as f:
+                msrp_data = orjson.loads(f.read())
+            conn.executemany(
+                "INSERT OR IGNORE INTO msrp_entries (brand, model, msrp_cad, msrp_usd) VALUES (?, ?, ?, ?)",
+                [
+                    (brand, model, prices.get("msrp_cad", 0), prices.get("msrp_usd"))
+                    for brand, models in msrp_data.items()
+                    for model, prices in models.items()
+                ],
+            )
 
-    conn.commit()
+    _commit(conn)
+
+
+# ── Read caches ───────────────────────────────────────────────
+
+_memoized: list = []
+
+
+def _ttl_memo(ttl: float):
+    """Memoize a zero-argument reader for ttl seconds.
+
+    Only calls that use the shared connection are cached; passing conn
+    bypasses the cache. Callers get a shallow copy of the cached value.
+    """
+    def decorator(func):
+        state = {"value": None, "expires": 0.0}
+
+        @functools.wraps(func)
+        def wrapper(conn: Optional[sqlite3.Connection] = None):
+            if conn is not None:
+                return func(conn)
+            now = time.monotonic()
+            if now >= state["expires"]:
+                state["value"] = func()
+                state["expires"] = now + ttl
+            return copy.copy(state["value"])
+
+        def cache_clear():
+            state["expires"] = 0.0
+
+        wrapper.cache_clear = cache_clear
+        _memoized.append(wrapper)
+        return wrapper
+    return decorator
+
+
+def clear_read_caches():
+    """Drop memoized summary reads after listing data changes."""
+    for func in _memoized:
+        func.cache_clear()
 
 
 # ── Settings CRUD ──────────────────────────────────────────────
 
 def get_setting(key: str, default: Any = None, conn: Optional[sqlite3.Connection] = None) -> Any:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
-    if close:
-        conn.close()
     if row:
-        return json.loads(row["value"])
+        return orjson.loads(row["value"])
     return default
 
 
 def set_setting(key: str, value: Any, conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            (key, _dumps(value))
+        )
+
+
+# Bumped whenever listing or MSRP data changes so readers can key caches on it.
+DATA_GENERATION_KEY = "data_generation"
+
+
+def get_data_generation(conn: Optional[sqlite3.Connection] = None) -> int:
+    if conn is None:
+        conn = get_shared_conn()
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (DATA_GENERATION_KEY,)).fetchone()
+    return row["value"] if row else 0
+
+
+def bump_data_generation(conn: Optional[sqlite3.Connection] = None):
+    if conn is None:
+        with transaction() as conn:
+            return bump_data_generation(conn)
     conn.execute(
-        "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-        (key, json.dumps(value))
+        """INSERT INTO app_meta (key, value) VALUES (?, 1)
+           ON CONFLICT(key) DO UPDATE SET value = value + 1""",
+        (DATA_GENERATION_KEY,),
     )
-    conn.commit()
-    if close:
-        conn.close()
 
 
 def get_all_settings(conn: Optional[sqlite3.Connection] = None) -> dict:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute("SELECT key, value FROM settings").fetchall()
-    if close:
-        conn.close()
-    return {row["key"]: json.loads(row["value"]) for row in rows}
+    return {row["key"]: orjson.loads(row["value"]) for row in rows}
 
 
 # ── Search Queries CRUD ───────────────────────────────────────
 
-def get_search_queries(enabled_only: bool = False, conn: Optional[sqlite3.Connection] = None) -> list[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+def get_search_queries(enabled_only: bool = False, conn: Optional[sqlite3.Connection] = None,
+                       label: Optional[str] = None, query_id: Optional[int] = None) -> list[dict]:
+    if conn is None:
+        conn = get_shared_conn()
+    where_clauses = []
+    params = []
     if enabled_only:
-        rows = conn.execute("SELECT * FROM search_queries WHERE enabled = 1 ORDER BY id").fetchall()
-    else:
-        rows = conn.execute("SELECT * FROM search_queries ORDER BY id").fetchall()
-    if close:
-        conn.close()
+        where_clauses.append("enabled = 1")
+    if label is not None:
+        where_clauses.append("label = ?")
+        params.append(label)
+    if query_id is not None:
+        where_clauses.append("id = ?")
+        params.append(query_id)
+    where = " AND ".join(where_clauses) if where_clauses else "1=1"
+    rows = conn.execute(f"SELECT * FROM search_queries WHERE {where} ORDER BY id", params).fetchall()
     return [dict(r) for r in rows]
 
 
+def get_search_query(query_id: int, conn: Optional[sqlite3.Connection] = None) -> Optional[dict]:
+    if conn is None:
+        conn = get_shared_conn()
+    row = conn.execute("SELECT * FROM search_queries WHERE id = ?", (query_id,)).fetchone()
+    return dict(row) if row else None
+
+
 def add_search_query(url: str, label: str, conn: Optional[sqlite3.Connection] = None) -> int:
-    close = conn is None
-    if close:
-        conn = get_conn()
-    cursor = conn.execute(
-        "INSERT INTO search_queries (url, label, enabled) VALUES (?, ?, 1)",
-        (url, label)
-    )
-    conn.commit()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        cursor = conn.execute(
+            "INSERT INTO search_queries (url, label, enabled) VALUES (?, ?, 1)",
+            (url, label)
+        )
     qid = cursor.lastrowid
-    if close:
-        conn.close()
     return qid
 
 
 def update_search_query(query_id: int, url: Optional[str] = None,
                         label: Optional[str] = None, enabled: Optional[bool] = None,
                         conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     updates = []
     params = []
     if url is not None:
@@ -292,31 +591,23 @@ def update_search_query(query_id: int, url: Optional[str] = None,
         params.append(1 if enabled else 0)
     if updates:
         params.append(query_id)
-        conn.execute(f"UPDATE search_queries SET {', '.join(updates)} WHERE id = ?", params)
-        conn.commit()
-    if close:
-        conn.close()
+        with transaction(conn):
+            conn.execute(f"UPDATE search_queries SET {', '.join(updates)} WHERE id = ?", params)
 
 
 def delete_search_query(query_id: int, conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute("DELETE FROM search_queries WHERE id = ?", (query_id,))
-    conn.commit()
-    if close:
-        conn.close()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute("DELETE FROM search_queries WHERE id = ?", (query_id,))
 
 
 # ── Brand Keywords CRUD ───────────────────────────────────────
 
 def get_brand_keywords(conn: Optional[sqlite3.Connection] = None) -> list[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute("SELECT * FROM brand_keywords ORDER BY brand, keyword").fetchall()
-    if close:
-        conn.close()
     return [dict(r) for r in rows]
 
 
@@ -330,39 +621,32 @@ def get_brand_keywords_map(conn: Optional[sqlite3.Connection] = None) -> dict[st
 
 
 def add_brand_keyword(brand: str, keyword: str, conn: Optional[sqlite3.Connection] = None) -> int:
-    close = conn is None
-    if close:
-        conn = get_conn()
-    cursor = conn.execute(
-        "INSERT OR IGNORE INTO brand_keywords (brand, keyword) VALUES (?, ?)",
-        (brand.lower(), keyword.lower())
-    )
-    conn.commit()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO brand_keywords (brand, keyword) VALUES (?, ?)",
+            (brand.lower(), keyword.lower())
+        )
+        bump_data_generation(conn)
     kid = cursor.lastrowid
-    if close:
-        conn.close()
     return kid
 
 
 def delete_brand_keyword(keyword_id: int, conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute("DELETE FROM brand_keywords WHERE id = ?", (keyword_id,))
-    conn.commit()
-    if close:
-        conn.close()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute("DELETE FROM brand_keywords WHERE id = ?", (keyword_id,))
+        bump_data_generation(conn)
 
 
 # ── MSRP CRUD ─────────────────────────────────────────────────
 
 def get_msrp_entries(conn: Optional[sqlite3.Connection] = None) -> list[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute("SELECT * FROM msrp_entries ORDER BY brand, model").fetchall()
-    if close:
-        conn.close()
     return [dict(r) for r in rows]
 
 
@@ -370,38 +654,59 @@ def upsert_msrp_entry(brand: str, model: str, msrp_cad: float,
                       msrp_usd: Optional[float] = None,
                       retail_price: Optional[float] = None,
                       conn: Optional[sqlite3.Connection] = None) -> int:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     
     from datetime import datetime, timezone
     now = datetime.now(timezone.utc).isoformat()
     
-    cursor = conn.execute("""
-        INSERT INTO msrp_entries (brand, model, msrp_cad, msrp_usd, retail_price, last_updated)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(brand, model) DO UPDATE SET 
-            msrp_cad = ?,
-            msrp_usd = ?,
-            retail_price = ?,
-            last_updated = ?
-    """, (brand.lower(), model, msrp_cad, msrp_usd, retail_price, now,
-           msrp_cad, msrp_usd, retail_price, now))
-    conn.commit()
+    with transaction(conn):
+        cursor = conn.execute("""
+            INSERT INTO msrp_entries (brand, model, msrp_cad, msrp_usd, retail_price, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(brand, model) DO UPDATE SET
+                msrp_cad = ?,
+                msrp_usd = ?,
+                retail_price = ?,
+                last_updated = ?
+        """, (brand.lower(), model, msrp_cad, msrp_usd, retail_price, now,
+               msrp_cad, msrp_usd, retail_price, now))
+        bump_data_generation(conn)
     eid = cursor.lastrowid
-    if close:
-        conn.close()
     return eid
 
 
+def upsert_retail_prices(entries: list[tuple], conn: Optional[sqlite3.Connection] = None) -> int:
+    """Bulk-apply scraped retail prices in one transaction.
+
+    Each entry is (brand, model, msrp_cad, msrp_usd, retail_price). New
+    models are inserted as given; existing ones keep their msrp_cad and
+    only get msrp_usd and retail_price refreshed.
+    """
+    if conn is None:
+        conn = get_shared_conn()
+
+    now = datetime.now(timezone.utc).isoformat()
+    with transaction(conn):
+        conn.executemany("""
+            INSERT INTO msrp_entries (brand, model, msrp_cad, msrp_usd, retail_price, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(brand, model) DO UPDATE SET
+                msrp_usd = excluded.msrp_usd,
+                retail_price = excluded.retail_price,
+                last_updated = excluded.last_updated
+        """, [(brand.lower(), model, msrp_cad, msrp_usd, retail_price, now)
+              for brand, model, msrp_cad, msrp_usd, retail_price in entries])
+        bump_data_generation(conn)
+    return len(entries)
+
+
 def delete_msrp_entry(entry_id: int, conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute("DELETE FROM msrp_entries WHERE id = ?", (entry_id,))
-    conn.commit()
-    if close:
-        conn.close()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute("DELETE FROM msrp_entries WHERE id = ?", (entry_id,))
+        bump_data_generation(conn)
 
 
 def get_msrp_map(conn: Optional[sqlite3.Connection] = None) -> dict:
@@ -420,50 +725,42 @@ def get_msrp_map(conn: Optional[sqlite3.Connection] = None) -> dict:
 
 def export_app_data(data_type: str = "all", conn: Optional[sqlite3.Connection] = None) -> dict:
     """Export search queries, brand keywords, and/or MSRP entries as a dictionary."""
-    close_after = False
     if conn is None:
-        conn = get_conn()
-        close_after = True
-
-    try:
-        result = {}
+        conn = get_shared_conn()
 
-        if data_type in ("all", "queries"):
-            queries = []
-            for row in conn.execute("SELECT url, label, enabled FROM search_queries").fetchall():
-                queries.append({"url": row["url"], "label": row["label"], "enabled": bool(row["enabled"])})
-            result["search_queries"] = queries
+    result = {}
 
-        if data_type in ("all", "brands"):
-            brands = []
-            for row in conn.execute("SELECT brand, keyword FROM brand_keywords").fetchall():
-                brands.append({"brand": row["brand"], "keyword": row["keyword"]})
-            result["brand_keywords"] = brands
+    if data_type in ("all", "queries"):
+        queries = []
+        for row in conn.execute("SELECT url, label, enabled FROM search_queries").fetchall():
+            queries.append({"url": row["url"], "label": row["label"], "enabled": bool(row["enabled"])})
+        result["search_queries"] = queries
+
+    if data_type in ("all", "brands"):
+        brands = []
+        for row in conn.execute("SELECT brand, keyword FROM brand_keywords").fetchall():
+            brands.append({"brand": row["brand"], "keyword": row["keyword"]})
+        result["brand_keywords"] = brands
+
+    if data_type in ("all", "msrp"):
+        msrp = []
+        for row in conn.execute("SELECT brand, model, msrp_cad, msrp_usd, retail_price FROM msrp_entries").fetchall():
+            msrp.append({
+                "brand": row["brand"],
+                "model": row["model"],
+                "msrp_cad": row["msrp_cad"],
+                "msrp_usd": row["msrp_usd"],
+                "retail_price": row["retail_price"]
+            })
+        result["msrp_entries"] = msrp
 
-        if data_type in ("all", "msrp"):
-            msrp = []
-            for row in conn.execute("SELECT brand, model, msrp_cad, msrp_usd, retail_price FROM msrp_entries").fetchall():
-                msrp.append({
-                    "brand": row["brand"],
-                    "model": row["model"],
-                    "msrp_cad": row["msrp_cad"],
-                    "msrp_usd": row["msrp_usd"],
-                    "retail_price": row["retail_price"]
-                })
-            result["msrp_entries"] = msrp
-
-        return result
-    finally:
-        if close_after:
-            conn.close()
+    return result
 
 
 def import_app_data(data: dict, data_type: str = "all", clear_existing: bool = False, overwrite: bool = False, conn: Optional[sqlite3.Connection] = None) -> dict:
     """Import search queries, brand keywords, and/or MSRP entries from a dictionary."""
-    close_after = False
     if conn is None:
-        conn = get_conn()
-        close_after = True
+        conn = get_shared_conn()
 
     result = {"queries": 0, "brands": 0, "msrp": 0}
     try:
@@ -497,6 +794,7 @@ def import_app_data(data: dict, data_type: str = "all", clear_existing: bool = F
                         (b["brand"].lower(), b["keyword"].lower())
                     )
                     result["brands"] += 1
+            bump_data_generation(conn)
 
         if data_type in ("all", "msrp"):
             msrp = data.get("msrp_entries", [])
@@ -525,188 +823,287 @@ def import_app_data(data: dict, data_type: str = "all", clear_existing: bool = F
                         (m["brand"].lower(), m["model"], m["msrp_cad"], m.get("msrp_usd"), m.get("retail_price"), now)
                     )
                     result["msrp"] += 1
+            bump_data_generation(conn)
         
-        conn.commit()
+        _commit(conn)
     except Exception as e:
         conn.rollback()
         raise e
-    finally:
-        if close_after:
-            conn.close()
     
     return result
 
 
 # ── Listings CRUD (unchanged from V1) ─────────────────────────
 
+# Stay below SQLite's default bound-parameter limit (999 on older builds).
+_MAX_IN_PARAMS = 900
+
+
+_INSERT_LISTING_SQL = """
+    INSERT INTO listings (kijiji_id, source, url, title, description, seller_name,
+                          location, image_urls, listing_date, first_seen, last_seen,
+                          is_active, is_hidden, is_starred, missed_runs, brand, model, msrp,
+                          current_price, original_price, nominal_price, on_sale, currency)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, 0, 0, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Listing columns an update only overwrites when the scrape supplied a value,
+# as (column, listing_data key). Instead of COALESCE(?, column) in SQL, the
+# SET clause names just the columns present for that row.
+_UPDATE_OPTIONAL_COLUMNS = (
+    ("description", "description"),
+    ("seller_name", "seller_name"),
+    ("location", "location"),
+    ("listing_date", "listing_date"),
+    ("brand", "brand"),
+    ("model", "model"),
+    ("msrp", "msrp"),
+    ("current_price", "price"),
+    ("nominal_price", "nominal_price"),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _update_listing_sql(columns: tuple[str, ...]) -> str:
+    """UPDATE statement setting ``columns`` plus the always-written ones.
+
+    Cached so each combination of present fields reuses one SQL string (and
+    so one prepared statement per connection).
+    """
+    optional = "".join(f"{column} = ?, " for column in columns)
+    return (
+        "UPDATE listings SET source = ?, url = ?, title = ?, "
+        f"{optional}last_seen = ?, is_active = 1, missed_runs = 0, "
+        "on_sale = ?, currency = ? WHERE kijiji_id = ?"
+    )
+
+
+def _insert_listing_params(listing_data: dict, now: str) -> tuple:
+    image_urls = listing_data.get("image_urls")
+    return (
+        listing_data["kijiji_id"],
+        listing_data.get("source", "kijiji"),
+        listing_data["url"],
+        listing_data["title"],
+        listing_data.get("description"),
+        listing_data.get("seller_name"),
+        listing_data.get("location"),
+        _dumps(image_urls) if image_urls else "[]",
+        listing_data.get("listing_date"),
+        now, now,
+        listing_data.get("brand"),
+        listing_data.get("model"),
+        listing_data.get("msrp"),
+        listing_data.get("price"),
+        listing_data.get("price"),
+        listing_data.get("nominal_price"),
+        1 if listing_data.get("on_sale", False) else 0,
+        listing_data.get("currency", "CAD").upper(),
+    )
+
+
+def _update_listing_params(listing_data: dict, now: str) -> tuple[str, tuple]:
+    """Return the (sql, params) updating an existing listing from listing_data.
+
+    Missing or None fields, and an empty image list, keep the stored values.
+    """
+    columns = []
+    params = [listing_data.get("source", "kijiji"), listing_data["url"], listing_data["title"]]
+    for column, key in _UPDATE_OPTIONAL_COLUMNS:
+        value = listing_data.get(key)
+        if value is not None:
+            columns.append(column)
+            params.append(value)
+    image_urls = listing_data.get("image_urls")
+    if image_urls:
+        columns.append("image_urls")
+        params.append(_dumps(image_urls))
+    params.extend((
+        now,
+        1 if listing_data.get("on_sale", False) else 0,
+        listing_data.get("currency", "CAD").upper(),
+        listing_data["kijiji_id"],
+    ))
+    return _update_listing_sql(tuple(columns)), tuple(params)
+
+
 def upsert_listing(listing_data: dict, conn: Optional[sqlite3.Connection] = None) -> bool:
     """Insert or update a listing. Returns True if this is a new listing."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        return upsert_listings_bulk([listing_data], conn) == 1
+
+
+def _existing_listing_ids(kijiji_ids: list[str], conn: sqlite3.Connection) -> set:
+    found = set()
+    for start in range(0, len(kijiji_ids), _MAX_IN_PARAMS):
+        chunk = kijiji_ids[start:start + _MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(row[0] for row in conn.execute(
+            f"SELECT kijiji_id FROM listings WHERE kijiji_id IN ({placeholders})", chunk
+        ))
+    return found
+
+
+def get_current_prices(kijiji_ids: list[str],
+                       conn: Optional[sqlite3.Connection] = None) -> dict:
+    """Return {kijiji_id: (current_price, currency)} for the listings that exist."""
+    if conn is None:
+        conn = get_shared_conn()
+    prices = {}
+    for start in range(0, len(kijiji_ids), _MAX_IN_PARAMS):
+        chunk = kijiji_ids[start:start + _MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT kijiji_id, current_price, currency FROM listings WHERE kijiji_id IN ({placeholders})",
+            chunk,
+        ):
+            prices[row[0]] = (row[1], row[2])
+    return prices
+
+
+def upsert_listings_bulk(listings_data: list[dict],
+                         conn: Optional[sqlite3.Connection] = None,
+                         existing_ids=None) -> int:
+    """Insert or update many listings in one transaction. Returns the number of new listings.
+
+    Same per-row semantics as upsert_listing; a listing repeated within the
+    batch is inserted once and then updated. Callers that already looked the
+    batch up (e.g. with get_current_prices) can pass the ids found as
+    existing_ids to skip the lookup here. Runs in its own transaction when
+    using the shared connection; callers passing conn commit themselves.
+    """
+    if conn is None:
+        with transaction() as conn:
+            return upsert_listings_bulk(listings_data, conn, existing_ids)
+    if not listings_data:
+        return 0
 
     now = datetime.now(timezone.utc).isoformat()
-    image_urls_json = json.dumps(listing_data.get("image_urls", []))
+    if existing_ids is None:
+        existing = _existing_listing_ids([d["kijiji_id"] for d in listings_data], conn)
+    else:
+        existing = set(existing_ids)
 
-    existing = conn.execute(
-        "SELECT kijiji_id, current_price FROM listings WHERE kijiji_id = ?",
-        (listing_data["kijiji_id"],)
-    ).fetchone()
+    inserts = []
+    updates: dict[str, list[tuple]] = {}
+    for listing_data in listings_data:
+        if listing_data["kijiji_id"] in existing:
+            sql, params = _update_listing_params(listing_data, now)
+            updates.setdefault(sql, []).append(params)
+        else:
+            existing.add(listing_data["kijiji_id"])
+            inserts.append(_insert_listing_params(listing_data, now))
 
-    is_new = existing is None
+    conn.executemany(_INSERT_LISTING_SQL, inserts)
+    # One executemany per combination of fields present.
+    for sql, rows in updates.items():
+        conn.executemany(sql, rows)
+    return len(inserts)
 
-    if is_new:
-        conn.execute("""
-            INSERT INTO listings (kijiji_id, source, url, title, description, seller_name,
-                                  location, image_urls, listing_date, first_seen, last_seen,
-                                  is_active, is_hidden, is_starred, missed_runs, brand, model, msrp,
-                                  current_price, original_price, nominal_price, on_sale, currency)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, 0, 0, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            listing_data["kijiji_id"],
-            listing_data.get("source", "kijiji"),
-            listing_data["url"],
-            listing_data["title"],
-            listing_data.get("description"),
-            listing_data.get("seller_name"),
-            listing_data.get("location"),
-            image_urls_json,
-            listing_data.get("listing_date"),
-            now, now,
-            listing_data.get("brand"),
-            listing_data.get("model"),
-            listing_data.get("msrp"),
-            listing_data.get("price"),
-            listing_data.get("price"),
-            listing_data.get("nominal_price"),
-            1 if listing_data.get("on_sale", False) else 0,
-            listing_data.get("currency", "CAD").upper(),
-        ))
-    else:
-        conn.execute("""
-            UPDATE listings SET
-                source = ?, url = ?, title = ?, description = COALESCE(?, description),
-                seller_name = COALESCE(?, seller_name),
-                location = COALESCE(?, location),
-                image_urls = CASE WHEN ? != '[]' THEN ? ELSE image_urls END,
-                listing_date = COALESCE(?, listing_date),
-                last_seen = ?, is_active = 1, missed_runs = 0,
-                brand = COALESCE(?, brand), model = COALESCE(?, model),
-                msrp = COALESCE(?, msrp),
-                current_price = COALESCE(?, current_price),
-                nominal_price = COALESCE(?, nominal_price),
-                on_sale = ?,
-                currency = COALESCE(?, currency)
-            WHERE kijiji_id = ?
-        """, (
-            listing_data.get("source", "kijiji"),
-            listing_data["url"],
-            listing_data["title"],
-            listing_data.get("description"),
-            listing_data.get("seller_name"),
-            listing_data.get("location"),
-            image_urls_json, image_urls_json,
-            listing_data.get("listing_date"),
-            now,
-            listing_data.get("brand"),
-            listing_data.get("model"),
-            listing_data.get("msrp"),
-            listing_data.get("price"),
-            listing_data.get("nominal_price"),
-            1 if listing_data.get("on_sale", False) else 0,
-            listing_data.get("currency", "CAD").upper(),
-            listing_data["kijiji_id"],
-        ))
 
-    conn.commit()
-    if close:
-        conn.close()
-    return is_new
+_INSERT_SNAPSHOT_SQL = "INSERT OR IGNORE INTO price_snapshots (kijiji_id, price, scraped_at) VALUES (?, ?, ?)"
 
 
 def add_price_snapshot(kijiji_id: str, price: Optional[float], scraped_at: str,
                        conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute(
-        "INSERT OR IGNORE INTO price_snapshots (kijiji_id, price, scraped_at) VALUES (?, ?, ?)",
-        (kijiji_id, price, scraped_at)
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute(
+            _INSERT_SNAPSHOT_SQL,
+            (kijiji_id, price, scraped_at)
+        )
+
+
+def add_price_snapshots_bulk(prices: list[tuple], scraped_at: str,
+                             conn: Optional[sqlite3.Connection] = None):
+    """Record many (kijiji_id, price) snapshots, all taken at scraped_at.
+
+    Runs in its own transaction when using the shared connection, like
+    upsert_listings_bulk.
+    """
+    if conn is None:
+        with transaction() as conn:
+            return add_price_snapshots_bulk(prices, scraped_at, conn)
+    conn.executemany(
+        _INSERT_SNAPSHOT_SQL,
+        ((kijiji_id, price, scraped_at) for kijiji_id, price in prices),
     )
-    conn.commit()
-    if close:
-        conn.close()
 
 
 def start_scrape_run(search_query: str = "", conn: Optional[sqlite3.Connection] = None) -> int:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     now = datetime.now(timezone.utc).isoformat()
-    cursor = conn.execute(
-        "INSERT INTO scrape_runs (started_at, search_query) VALUES (?, ?)",
-        (now, search_query)
-    )
-    conn.commit()
+    with transaction(conn):
+        cursor = conn.execute(
+            "INSERT INTO scrape_runs (started_at, search_query) VALUES (?, ?)",
+            (now, search_query)
+        )
     run_id = cursor.lastrowid
-    if close:
-        conn.close()
     return run_id
 
 
+_ANALYZE_MIN_CHANGES = 100
+
+
 def finish_scrape_run(run_id: int, listings_found: int, new_listings: int,
                       price_changes: int, errors: int,
                       conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     now = datetime.now(timezone.utc).isoformat()
-    conn.execute("""
-        UPDATE scrape_runs SET finished_at = ?, listings_found = ?,
-               new_listings = ?, price_changes = ?, errors = ?
-        WHERE id = ?
-    """, (now, listings_found, new_listings, price_changes, errors, run_id))
-    conn.commit()
-    if close:
-        conn.close()
+    with transaction(conn):
+        conn.execute("""
+            UPDATE scrape_runs SET finished_at = ?, listings_found = ?,
+                   new_listings = ?, price_changes = ?, errors = ?
+            WHERE id = ?
+        """, (now, listings_found, new_listings, price_changes, errors, run_id))
+        # A run that changed many rows can shift the index statistics the
+        # planner relies on (the partial indexes in particular); refresh them.
+        if new_listings + price_changes > _ANALYZE_MIN_CHANGES:
+            conn.execute("ANALYZE listings")
+            conn.execute("ANALYZE price_snapshots")
 
 
 def increment_missed_runs(seen_ids: set, conn: Optional[sqlite3.Connection] = None):
     """Increment missed_runs for active listings not seen, mark inactive if threshold hit."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
 
     inactive_threshold = get_setting("inactive_threshold", 3, conn)
 
-    active = conn.execute(
-        "SELECT kijiji_id FROM listings WHERE is_active = 1"
-    ).fetchall()
+    # Bind the seen ids as one JSON array and read it back with json_each,
+    # so each update is a single anti-join with no temp table to manage.
+    seen_json = _dumps(list(seen_ids))
+    with transaction(conn):
+        conn.execute("""
+            UPDATE listings SET missed_runs = missed_runs + 1
+            WHERE is_active = 1 AND kijiji_id NOT IN (SELECT value FROM json_each(?))
+        """, (seen_json,))
+        conn.execute("""
+            UPDATE listings SET is_active = 0
+            WHERE is_active = 1 AND missed_runs >= ?
+              AND kijiji_id NOT IN (SELECT value FROM json_each(?))
+        """, (inactive_threshold, seen_json))
 
-    for row in active:
-        kid = row["kijiji_id"]
-        if kid not in seen_ids:
-            conn.execute(
-                "UPDATE listings SET missed_runs = missed_runs + 1 WHERE kijiji_id = ?",
-                (kid,)
-            )
-            conn.execute("""
-                UPDATE listings SET is_active = 0
-                WHERE kijiji_id = ? AND missed_runs >= ?
-            """, (kid, inactive_threshold))
 
-    conn.commit()
-    if close:
-        conn.close()
+# The trigram tokenizer matches any substring of at least three characters,
+# case-insensitively, like the LIKE '%...%' filters it replaces; shorter
+# terms have no trigrams and keep the LIKE scan.
+_FTS_MIN_TERM = 3
+_FTS_MATCH_SQL = "rowid IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)"
 
 
-def get_listings(filters: Optional[dict] = None,
-                 conn: Optional[sqlite3.Connection] = None) -> list[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+def _fts_phrase(columns: tuple[str, ...], text: str) -> str:
+    """Build an FTS5 query matching ``text`` literally in any of ``columns``."""
+    phrase = text.replace('"', '""')
+    return f'{{{" ".join(columns)}}} : "{phrase}"'
+
 
-    filters = filters or {}
+def _listings_query(filters: dict, columns: Optional[tuple[str, ...]] = None) -> tuple[str, list]:
     where_clauses = []
     params = []
 
@@ -736,12 +1133,20 @@ def get_listings(filters: Optional[dict] = None,
         params.append(filters["max_price"])
 
     if filters.get("location"):
-        where_clauses.append("location LIKE ?")
-        params.append(f"%{filters['location']}%")
+        if len(filters["location"]) >= _FTS_MIN_TERM:
+            where_clauses.append(_FTS_MATCH_SQL)
+            params.append(_fts_phrase(("location",), filters["location"]))
+        else:
+            where_clauses.append("location LIKE ?")
+            params.append(f"%{filters['location']}%")
 
     if filters.get("search"):
-        where_clauses.append("(title LIKE ? OR description LIKE ?)")
-        params.extend([f"%{filters['search']}%", f"%{filters['search']}%"])
+        if len(filters["search"]) >= _FTS_MIN_TERM:
+            where_clauses.append(_FTS_MATCH_SQL)
+            params.append(_fts_phrase(("title", "description"), filters["search"]))
+        else:
+            where_clauses.append("(title LIKE ? OR description LIKE ?)")
+            params.extend([f"%{filters['search']}%", f"%{filters['search']}%"])
 
     where = " AND ".join(where_clauses) if where_clauses else "1=1"
 
@@ -770,63 +1175,128 @@ def get_listings(filters: Optional[dict] = None,
     }
     sort = sort_map.get(filters.get("sort_by", "last_seen_desc"), "last_seen DESC")
 
-    rows = conn.execute(
-        f"SELECT * FROM listings WHERE {where} ORDER BY {sort}", params
-    ).fetchall()
+    select = ", ".join(columns) if columns else "*"
+    sql = f"SELECT {select} FROM listings WHERE {where} ORDER BY {sort}"
 
-    result = [dict(row) for row in rows]
-    if close:
-        conn.close()
-    return result
+    if filters.get("limit") is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([filters["limit"], filters.get("offset") or 0])
+
+    return sql, params
+
+
+def get_listings_iter(filters: Optional[dict] = None,
+                      conn: Optional[sqlite3.Connection] = None,
+                      columns: Optional[tuple[str, ...]] = None) -> Iterator[dict]:
+    """Yield get_listings' rows one at a time instead of building the list.
+
+    ``filters["limit"]``/``filters["offset"]`` page the query in SQL, and
+    ``columns`` limits the row to the named (trusted, not user-supplied)
+    columns instead of all of them. The cursor stays open until the
+    generator is exhausted, so finish it before writing on the same
+    connection.
+    """
+    if conn is None:
+        conn = get_shared_conn()
+    sql, params = _listings_query(filters or {}, columns)
+    for row in conn.execute(sql, params):
+        yield dict(row)
+
+
+def get_listings(filters: Optional[dict] = None,
+                 conn: Optional[sqlite3.Connection] = None,
+                 columns: Optional[tuple[str, ...]] = None) -> list[dict]:
+    return list(get_listings_iter(filters, conn, columns))
+
+
+# The cheap half of tracker.compute_deals' "is this a deal" test, evaluated
+# in SQL so listings that can never qualify are not materialized. It must
+# stay a superset of what compute_deals keeps; compute_deals re-checks.
+_DEAL_CANDIDATES_SQL = """
+    SELECT * FROM listings AS l
+    WHERE l.is_active = 1 AND l.is_hidden = 0
+      AND l.current_price > 0
+      AND COALESCE(l.nominal_price, l.original_price) IS NOT NULL
+      AND (
+        COALESCE(l.nominal_price, l.original_price) > l.current_price
+        OR (l.msrp > 0 AND l.current_price / l.msrp < 0.7)
+        OR EXISTS (
+          SELECT 1 FROM msrp_entries AS m
+          WHERE m.brand = l.brand AND m.model = l.model
+            AND m.retail_price > 0 AND l.current_price / m.retail_price < 0.9
+        )
+      )
+    ORDER BY l.last_seen DESC
+"""
+
+
+def get_deal_candidates(conn: Optional[sqlite3.Connection] = None) -> list[dict]:
+    """Active, visible listings that could qualify as a deal, for compute_deals."""
+    if conn is None:
+        conn = get_shared_conn()
+    return [dict(row) for row in conn.execute(_DEAL_CANDIDATES_SQL).fetchall()]
 
 
 def get_listing(kijiji_id: str, conn: Optional[sqlite3.Connection] = None) -> Optional[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     row = conn.execute(
         "SELECT * FROM listings WHERE kijiji_id = ?", (kijiji_id,)
     ).fetchone()
     result = dict(row) if row else None
-    if close:
-        conn.close()
     return result
 
 
 def set_listing_hidden(kijiji_id: str, hidden: bool,
                        conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute(
-        "UPDATE listings SET is_hidden = ? WHERE kijiji_id = ?",
-        (1 if hidden else 0, kijiji_id),
-    )
-    conn.commit()
-    if close:
-        conn.close()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute(
+            "UPDATE listings SET is_hidden = ? WHERE kijiji_id = ?",
+            (1 if hidden else 0, kijiji_id),
+        )
+        bump_data_generation(conn)
+
+
+def set_listings_hidden(kijiji_ids: list[str], hidden: bool,
+                        conn: Optional[sqlite3.Connection] = None) -> int:
+    """Hide or unhide many listings at once. Returns number of rows updated."""
+    if conn is None:
+        with transaction() as conn:
+            return set_listings_hidden(kijiji_ids, hidden, conn)
+
+    updated = 0
+    value = 1 if hidden else 0
+    for start in range(0, len(kijiji_ids), _MAX_IN_PARAMS):
+        chunk = kijiji_ids[start:start + _MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"UPDATE listings SET is_hidden = ? WHERE kijiji_id IN ({placeholders})",
+            (value, *chunk),
+        )
+        updated += cur.rowcount
+    if updated:
+        bump_data_generation(conn)
+    return updated
 
 
 def set_listing_starred(kijiji_id: str, starred: bool,
                         conn: Optional[sqlite3.Connection] = None):
-    close = conn is None
-    if close:
-        conn = get_conn()
-    conn.execute(
-        "UPDATE listings SET is_starred = ? WHERE kijiji_id = ?",
-        (1 if starred else 0, kijiji_id),
-    )
-    conn.commit()
-    if close:
-        conn.close()
+    if conn is None:
+        conn = get_shared_conn()
+    with transaction(conn):
+        conn.execute(
+            "UPDATE listings SET is_starred = ? WHERE kijiji_id = ?",
+            (1 if starred else 0, kijiji_id),
+        )
 
 
 def update_listing_brand_model(kijiji_id: str, brand: Optional[str], model: Optional[str],
                                conn: Optional[sqlite3.Connection] = None) -> bool:
     """Manually update listing brand/model and refresh MSRP from msrp_entries."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
 
     normalized_brand = (brand or "").strip().lower() or None
     normalized_model = (model or "").strip() or None
@@ -845,61 +1315,56 @@ def update_listing_brand_model(kijiji_id: str, brand: Optional[str], model: Opti
         if row:
             msrp = row["msrp_cad"]
 
-    cursor = conn.execute(
-        "UPDATE listings SET brand = ?, model = ?, msrp = ? WHERE kijiji_id = ?",
-        (normalized_brand, normalized_model, msrp, kijiji_id),
-    )
-    updated = cursor.rowcount > 0
-    conn.commit()
+    with transaction(conn):
+        cursor = conn.execute(
+            "UPDATE listings SET brand = ?, model = ?, msrp = ? WHERE kijiji_id = ?",
+            (normalized_brand, normalized_model, msrp, kijiji_id),
+        )
+        updated = cursor.rowcount > 0
+        if updated:
+            bump_data_generation(conn)
 
-    if close:
-        conn.close()
     return updated
 
 
 def delete_listing(kijiji_id: str, conn: Optional[sqlite3.Connection] = None) -> bool:
     """Delete one listing and its price snapshots. Returns True if deleted."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        with transaction() as conn:
+            return delete_listing(kijiji_id, conn)
 
     conn.execute("DELETE FROM price_snapshots WHERE kijiji_id = ?", (kijiji_id,))
     cursor = conn.execute("DELETE FROM listings WHERE kijiji_id = ?", (kijiji_id,))
     deleted = cursor.rowcount > 0
-
-    if close:
-        conn.commit()
-        conn.close()
+    if deleted:
+        bump_data_generation(conn)
     return deleted
 
 
 def delete_listings(kijiji_ids: list[str], conn: Optional[sqlite3.Connection] = None) -> int:
     """Delete multiple listings and their snapshots. Returns number deleted."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        with transaction() as conn:
+            return delete_listings(kijiji_ids, conn)
 
     deleted = 0
     for kid in kijiji_ids:
         if delete_listing(kid, conn=conn):
             deleted += 1
-
-    if close:
-        conn.commit()
-        conn.close()
     return deleted
 
 
 def clear_database(preserve_settings: bool = True,
                    conn: Optional[sqlite3.Connection] = None) -> dict:
     """Clear listing data. Optionally clear configuration tables too."""
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        with transaction() as conn:
+            return clear_database(preserve_settings, conn)
 
     conn.execute("DELETE FROM price_snapshots")
     conn.execute("DELETE FROM listings")
     conn.execute("DELETE FROM scrape_runs")
+    bump_data_generation(conn)
 
     result = {
         "cleared": ["price_snapshots", "listings", "scrape_runs"],
@@ -918,86 +1383,107 @@ def clear_database(preserve_settings: bool = True,
     conn.execute(
         "DELETE FROM sqlite_sequence WHERE name IN ('price_snapshots', 'scrape_runs', 'search_queries', 'brand_keywords', 'msrp_entries')"
     )
-
-    if close:
-        conn.commit()
-        conn.close()
     return result
 
 
-def get_price_history(kijiji_id: str, conn: Optional[sqlite3.Connection] = None) -> list[dict]:
-    close = conn is None
-    if close:
-        conn = get_conn()
-    rows = conn.execute(
+def vacuum_database(conn: Optional[sqlite3.Connection] = None):
+    """VACUUM the database, then rebuild listings_fts against the new rowids."""
+    if conn is None:
+        conn = get_shared_conn()
+    conn.execute("VACUUM")
+    with transaction(conn):
+        conn.execute("INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')")
+
+
+def get_price_history(kijiji_id: str,
+                      conn: Optional[sqlite3.Connection] = None) -> list[tuple[Optional[float], str]]:
+    """Return the listing's snapshots as (price, scraped_at) tuples, oldest first."""
+    if conn is None:
+        conn = get_shared_conn()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(
         "SELECT price, scraped_at FROM price_snapshots WHERE kijiji_id = ? ORDER BY scraped_at",
         (kijiji_id,)
     ).fetchall()
-    result = [dict(row) for row in rows]
-    if close:
-        conn.close()
-    return result
 
 
+def get_price_history_compact(kijiji_id: str,
+                              conn: Optional[sqlite3.Connection] = None) -> tuple[list[str], list[float]]:
+    """Return (dates, prices) for charting, with dates trimmed to YYYY-MM-DD."""
+    if conn is None:
+        conn = get_shared_conn()
+    cursor = conn.cursor()
+    # Plain tuples: cheaper to build and unzip than sqlite3.Row.
+    cursor.row_factory = None
+    rows = cursor.execute(
+        "SELECT substr(scraped_at, 1, 10), price FROM price_snapshots WHERE kijiji_id = ? ORDER BY scraped_at",
+        (kijiji_id,)
+    ).fetchall()
+    if not rows:
+        return [], []
+    dates, prices = map(list, zip(*rows))
+    return dates, prices
+
+
+@_ttl_memo(60)
 def get_distinct_brands(conn: Optional[sqlite3.Connection] = None) -> list[str]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute(
         "SELECT DISTINCT brand FROM listings WHERE brand IS NOT NULL AND is_active = 1 ORDER BY brand"
     ).fetchall()
     result = [row["brand"] for row in rows]
-    if close:
-        conn.close()
     return result
 
 
 def get_distinct_models(conn: Optional[sqlite3.Connection] = None) -> list[str]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute(
         "SELECT DISTINCT model FROM listings WHERE model IS NOT NULL AND is_active = 1 ORDER BY model"
     ).fetchall()
     result = [row["model"] for row in rows]
-    if close:
-        conn.close()
     return result
 
 
 def get_distinct_locations(conn: Optional[sqlite3.Connection] = None) -> list[str]:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
     rows = conn.execute(
         "SELECT DISTINCT location FROM listings WHERE location IS NOT NULL AND is_active = 1 ORDER BY location"
     ).fetchall()
     result = [row["location"] for row in rows]
-    if close:
-        conn.close()
     return result
 
 
+@_ttl_memo(60)
 def get_stats(conn: Optional[sqlite3.Connection] = None) -> dict:
-    close = conn is None
-    if close:
-        conn = get_conn()
+    if conn is None:
+        conn = get_shared_conn()
+
+    # All listing counts in a single pass over the table, with the other
+    # tables' counts alongside in the same statement.
+    row = conn.execute("""
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(is_active = 1), 0) AS active,
+               COALESCE(SUM(is_active = 1 AND current_price < original_price), 0) AS drops,
+               (SELECT COUNT(*) FROM price_snapshots) AS snapshots,
+               (SELECT COUNT(*) FROM scrape_runs) AS runs
+        FROM listings
+    """).fetchone()
 
     stats = {}
-    stats["total_listings"] = conn.execute("SELECT COUNT(*) as c FROM listings").fetchone()["c"]
-    stats["active_listings"] = conn.execute("SELECT COUNT(*) as c FROM listings WHERE is_active = 1").fetchone()["c"]
-    stats["total_snapshots"] = conn.execute("SELECT COUNT(*) as c FROM price_snapshots").fetchone()["c"]
-    stats["total_scrape_runs"] = conn.execute("SELECT COUNT(*) as c FROM scrape_runs").fetchone()["c"]
+    stats["total_listings"] = row["total"]
+    stats["active_listings"] = row["active"]
+    stats["total_snapshots"] = row["snapshots"]
+    stats["total_scrape_runs"] = row["runs"]
 
     last_run = conn.execute(
         "SELECT * FROM scrape_runs ORDER BY started_at DESC LIMIT 1"
     ).fetchone()
     stats["last_run"] = dict(last_run) if last_run else None
 
-    stats["listings_with_drops"] = conn.execute(
-        "SELECT COUNT(*) as c FROM listings WHERE current_price < original_price AND is_active = 1"
-    ).fetchone()["c"]
+    stats["listings_with_drops"] = row["drops"]
 
-    if close:
-        conn.close()
     return stats
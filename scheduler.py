@@ -2,7 +2,9 @@
 
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import islice
 from typing import Optional
 from urllib.parse import urlparse
 
@@ -10,8 +12,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 import db
 from notifier import send_webhook_event
-from scraper import KijijiScraper, RetailScraper
-from tracker import compute_deals, detect_brand, detect_model, lookup_msrp
+from tracker import compute_deals, detect_brand_model, lookup_msrp
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,13 @@ _lock = threading.Lock()
 _last_result: Optional[dict] = None
 _is_running = False
 
+# Upper bound on queries fetched at once from any one site, however many
+# workers the run uses, to stay under the sites' rate limits.
+MAX_CONCURRENT_PER_SOURCE = 4
+
+# Listings written per bulk upsert while a query's results stream in.
+WRITE_BATCH_SIZE = 100
+
 
 def _source_from_url(url: str) -> str:
     host = urlparse(url).netloc.lower()
@@ -53,11 +61,80 @@ def _emit_event(event_type: str, payload: dict, settings: dict):
         logger.warning(f"Webhook send failed for event={event_type}: {e}")
 
 
+def _batched(iterable, size: int):
+    """Yield lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _iter_fetched(queries: list[dict], make_scrapers, max_pages: int, concurrency: int):
+    """Yield (query, source, listings, error) for each query, in query order.
+
+    listings is an iterable; for serial Kijiji queries it is a generator
+    that fetches pages lazily.
+
+    With concurrency > 1 the queries are fetched on a thread pool, each
+    worker with its own scrapers and session; results are still consumed
+    in order on the calling thread, which owns the DB connection.
+    """
+    def fetch(q, scrapers):
+        logger.info(f"Searching: {q['label']} ...")
+        source = _source_from_url(q["url"])
+        kijiji_scraper, retail_scraper = scrapers
+        if source == "kijiji":
+            if stream:
+                return source, kijiji_scraper.iter_search(q["url"], max_pages=max_pages)
+            return source, kijiji_scraper.scrape_search(q["url"], max_pages=max_pages)
+        return source, retail_scraper.scrape_url(q["url"])
+
+    # Serially, Kijiji results are streamed so each batch is written while
+    # later pages are still to be fetched; pooled workers hand back lists.
+    stream = concurrency <= 1 or len(queries) <= 1
+
+    if stream:
+        scrapers = make_scrapers()
+        for q in queries:
+            try:
+                source, listings = fetch(q, scrapers)
+            except Exception as e:
+                yield q, None, None, e
+                continue
+            yield q, source, listings, None
+        return
+
+    local = threading.local()
+    per_source = min(concurrency, MAX_CONCURRENT_PER_SOURCE)
+    semaphores = {
+        source: threading.BoundedSemaphore(per_source)
+        for source in {_source_from_url(q["url"]) for q in queries}
+    }
+
+    def fetch_in_worker(q):
+        if not hasattr(local, "scrapers"):
+            local.scrapers = make_scrapers()
+        with semaphores[_source_from_url(q["url"])]:
+            return fetch(q, local.scrapers)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(queries))) as executor:
+        futures = [executor.submit(fetch_in_worker, q) for q in queries]
+        for q, future in zip(queries, futures):
+            try:
+                source, listings = future.result()
+            except Exception as e:
+                yield q, None, None, e
+                continue
+            yield q, source, listings, None
+
+
 def run_scrape(max_pages: Optional[int] = None,
                query_filter: Optional[str] = None,
-               query_id: Optional[int] = None) -> dict:
+               query_id: Optional[int] = None,
+               concurrency: int = 1) -> dict:
     """Run a full scrape cycle. Shared between CLI and scheduler.
 
+    concurrency sets how many search queries are fetched in parallel.
+
     Returns a summary dict with counts.
     """
     global _last_result, _is_running
@@ -68,6 +145,7 @@ def run_scrape(max_pages: Optional[int] = None,
     _is_running = True
     conn = None
     settings = {}
+    sessions = []
     try:
         conn = db.get_conn()
 
@@ -79,15 +157,24 @@ def run_scrape(max_pages: Optional[int] = None,
         delay_max = settings.get("request_delay_max", 5.0)
         fx_rates = settings.get("fx_rates_to_usd", {"USD": 1.0})
 
-        kijiji_scraper = KijijiScraper(delay_min=delay_min, delay_max=delay_max, max_pages=max_pages)
-        retail_scraper = RetailScraper(delay_min=delay_min, delay_max=delay_max)
+        # Imported here so loading the scheduler (and with it the web app)
+        # doesn't pull in bs4/lxml until a scrape actually runs.
+        from scraper import KijijiScraper, RetailScraper, make_session
+
+        def make_scrapers():
+            # One pooled session per worker so consecutive pages and
+            # queries reuse open connections.
+            session = make_session()
+            sessions.append(session)
+            return (
+                KijijiScraper(session=session, delay_min=delay_min, delay_max=delay_max, max_pages=max_pages),
+                RetailScraper(session=session, delay_min=delay_min, delay_max=delay_max),
+            )
 
         # Get enabled search queries from DB
-        queries = db.get_search_queries(enabled_only=True, conn=conn)
-        if query_filter:
-            queries = [q for q in queries if q["label"] == query_filter]
-        if query_id is not None:
-            queries = [q for q in queries if q["id"] == query_id]
+        queries = db.get_search_queries(
+            enabled_only=True, conn=conn, label=query_filter or None, query_id=query_id,
+        )
 
         total_found = 0
         total_new = 0
@@ -101,74 +188,102 @@ def run_scrape(max_pages: Optional[int] = None,
         )
         now = datetime.now(timezone.utc).isoformat()
 
-        for q in queries:
-            logger.info(f"Searching: {q['label']} ...")
-            source = _source_from_url(q["url"])
-            try:
-                if source == "kijiji":
-                    listings = kijiji_scraper.scrape_search(q["url"], max_pages=max_pages)
-                else:
-                    listings = retail_scraper.scrape_url(q["url"])
-            except Exception as e:
-                logger.error(f"Error scraping {q['label']}: {e}")
+        for q, source, listings, error in _iter_fetched(queries, make_scrapers, max_pages, concurrency):
+            if error is not None:
+                logger.error(f"Error scraping {q['label']}: {error}")
                 total_errors += 1
                 continue
 
-            logger.info(f"  Found {len(listings)} listings")
-            total_found += len(listings)
-
-            for listing in listings:
-                all_seen_ids.add(listing.kijiji_id)
-
-                brand = detect_brand(listing.title, listing.description or "")
-                model = detect_model(listing.title, listing.description or "", brand)
-                msrp = lookup_msrp(brand, model)
-
-                existing = db.get_listing(listing.kijiji_id, conn=conn)
-                if existing and existing["current_price"] is not None and listing.price is not None:
-                    old_usd = _to_usd(existing["current_price"], existing["currency"], fx_rates)
-                    new_usd = _to_usd(listing.price, listing.currency, fx_rates)
-                    if old_usd is not None and new_usd is not None and round(old_usd, 2) != round(new_usd, 2):
-                        total_price_changes += 1
-                        direction = "down" if new_usd < old_usd else "up"
-                        logger.info(
-                            f"  USD price {direction}: {listing.title[:50]} "
-                            f"${old_usd:.2f} -> ${new_usd:.2f}"
-                        )
-
-                listing_data = {
-                    "kijiji_id": listing.kijiji_id,
-                    "source": listing.source or source,
-                    "url": listing.url,
-                    "title": listing.title,
-                    "price": listing.price,
-                    "currency": listing.currency,
-                    "nominal_price": listing.nominal_price,
-                    "on_sale": listing.on_sale,
-                    "description": listing.description,
-                    "seller_name": listing.seller_name,
-                    "location": listing.location,
-                    "listing_date": listing.listing_date,
-                    "image_urls": listing.image_urls,
-                    "brand": brand,
-                    "model": model,
-                    "msrp": msrp,
-                }
-
-                is_new = db.upsert_listing(listing_data, conn=conn)
-                if is_new:
-                    total_new += 1
-
-                db.add_price_snapshot(listing.kijiji_id, listing.price, now, conn=conn)
+            found = 0
+            batches = _batched(listings, WRITE_BATCH_SIZE)
+            while True:
+                # Only fetching is guarded here; a streamed query can fail
+                # part-way, after its earlier batches were written.
+                try:
+                    batch = next(batches, None)
+                except Exception as e:
+                    logger.error(f"Error scraping {q['label']}: {e}")
+                    total_errors += 1
+                    break
+                if batch is None:
+                    break
+                found += len(batch)
+                existing_prices = db.get_current_prices([l.kijiji_id for l in batch], conn=conn)
+                existing_ids = set(existing_prices)
+                # Read once per batch rather than per listing; keyword/MSRP
+                # edits made mid-run apply from the next batch.
+                generation = db.get_data_generation(conn)
+                listings_data = []
+                snapshots = {}
+                for listing in batch:
+                    all_seen_ids.add(listing.kijiji_id)
+
+                    brand, model = detect_brand_model(listing.title, listing.description, generation)
+                    msrp = lookup_msrp(brand, model, generation)
+
+                    old_price, old_currency = existing_prices.get(listing.kijiji_id, (None, None))
+                    if old_price is not None and listing.price is not None:
+                        old_usd = _to_usd(old_price, old_currency, fx_rates)
+                        new_usd = _to_usd(listing.price, listing.currency, fx_rates)
+                        if old_usd is not None and new_usd is not None and round(old_usd, 2) != round(new_usd, 2):
+                            total_price_changes += 1
+                            direction = "down" if new_usd < old_usd else "up"
+                            # Lazy %-formatting: skipped entirely when INFO is off.
+                            logger.info(
+                                "  USD price %s: %.50s $%.2f -> $%.2f",
+                                direction, listing.title, old_usd, new_usd,
+                            )
+                    # A listing repeated within the batch is compared against
+                    # its earlier occurrence, as if that had been written.
+                    existing_prices[listing.kijiji_id] = (listing.price, listing.currency)
+
+                    listing_data = {
+                        "kijiji_id": listing.kijiji_id,
+                        "source": listing.source or source,
+                        "url": listing.url,
+                        "title": listing.title,
+                        "price": listing.price,
+                        "currency": listing.currency,
+                        "nominal_price": listing.nominal_price,
+                        "on_sale": listing.on_sale,
+                        "description": listing.description,
+                        "seller_name": listing.seller_name,
+                        "location": listing.location,
+                        "listing_date": listing.listing_date,
+                        "image_urls": listing.image_urls,
+                        "brand": brand,
+                        "model": model,
+                        "msrp": msrp,
+                    }
+
+                    listings_data.append(listing_data)
+                    # First occurrence wins, as the (kijiji_id, scraped_at)
+                    # UNIQUE constraint would keep it anyway.
+                    snapshots.setdefault(listing.kijiji_id, listing.price)
+
+                # One transaction per batch: listings and their snapshots
+                # land together, without holding the write lock across fetches.
+                # IMMEDIATE takes the write lock at BEGIN, so a busy database
+                # is waited out before any of the batch runs.
+                with db.transaction(conn, immediate=True):
+                    total_new += db.upsert_listings_bulk(
+                        listings_data, conn=conn, existing_ids=existing_ids,
+                    )
+                    db.add_price_snapshots_bulk(list(snapshots.items()), now, conn=conn)
+
+            logger.info(f"  Found {found} listings")
+            total_found += found
 
         db.increment_missed_runs(all_seen_ids, conn=conn)
+        db.bump_data_generation(conn)
         db.finish_scrape_run(run_id, total_found, total_new, total_price_changes, total_errors, conn=conn)
+        db.clear_read_caches()
 
         deal_ratio_max = float(settings.get("webhook_deal_max_price_to_retail_ratio", 0.9))
         deal_drop_min = float(settings.get("webhook_deal_min_drop_pct", 15.0))
         deal_batch_size = int(settings.get("webhook_deal_batch_size", 5))
         qualifying_deals = []
-        for deal in compute_deals(db.get_listings({"active_only": True}, conn=conn)):
+        for deal in compute_deals(db.get_deal_candidates(conn=conn)):
             ratio_match = deal.price_to_retail_ratio is not None and deal.price_to_retail_ratio <= deal_ratio_max
             drop_match = deal.price_drop_pct >= deal_drop_min
             if ratio_match or drop_match:
@@ -185,7 +300,7 @@ def run_scrape(max_pages: Optional[int] = None,
             if len(qualifying_deals) >= deal_batch_size:
                 break
 
-        conn.close()
+        db.close_conn(conn)
         conn = None
 
         result = {
@@ -218,13 +333,18 @@ def run_scrape(max_pages: Optional[int] = None,
     except Exception as e:
         logger.error(f"Scrape failed: {e}")
         if conn:
-            conn.close()
+            db.close_conn(conn)
         _emit_event("scrape_failed", {
             "error": str(e),
             "finished_at": datetime.now(timezone.utc).isoformat(),
         }, settings)
         return {"error": str(e)}
     finally:
+        for session in sessions:
+            session.close()
+        # Manual scrapes run on a fresh thread each time; don't leave that
+        # thread's shared connections (opened by the tracker lookups) behind.
+        db.close_thread_conns()
         _is_running = False
 
 
@@ -1,35 +1,55 @@
 """Core Kijiji scraping logic."""
 
 import hashlib
+import itertools
 import json
 import logging
 import random
 import re
+import threading
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 from urllib.parse import parse_qs, urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 from config import USER_AGENTS
 from models import ScrapedListing
 
 logger = logging.getLogger(__name__)
 
+# Round-robin User-Agent rotation, shared by all scrapers; spreads requests
+# evenly over the list without drawing a random number per request.
+_USER_AGENT_CYCLE = itertools.cycle(USER_AGENTS)
+
+# Formbot product pages fetched in parallel per collection page.
+FORMBOT_PRODUCT_WORKERS = 4
+
+
+def make_session(pool_connections: int = 4, pool_maxsize: int = 20) -> requests.Session:
+    """Session with a keep-alive connection pool big enough to share between scrapers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
 class KijijiScraper:
     def __init__(self, session: Optional[requests.Session] = None,
                  delay_min: float = 2.0, delay_max: float = 5.0,
                  max_pages: int = 5):
-        self.session = session or requests.Session()
+        self.session = session or make_session()
         self.delay_min = delay_min
         self.delay_max = delay_max
         self.max_pages = max_pages
         self._rotate_ua()
 
     def _rotate_ua(self):
-        self.session.headers.update({"User-Agent": random.choice(USER_AGENTS)})
+        self.session.headers.update({"User-Agent": next(_USER_AGENT_CYCLE)})
 
     def _delay(self):
         time.sleep(random.uniform(self.delay_min, self.delay_max))
@@ -42,10 +62,14 @@ class KijijiScraper:
         return f"{parts[0]}/page-{page}/{parts[1]}"
 
     def scrape_search(self, base_url: str, max_pages: Optional[int] = None) -> list[ScrapedListing]:
-        max_pages = max_pages or self.max_pages
         """Scrape all pages of a search query. Returns deduplicated listings."""
-        all_listings = []
+        return list(self.iter_search(base_url, max_pages=max_pages))
+
+    def iter_search(self, base_url: str, max_pages: Optional[int] = None) -> Iterator[ScrapedListing]:
+        """Like scrape_search, but yields deduplicated listings page by page as they are fetched."""
+        max_pages = max_pages or self.max_pages
         seen_ids = set()
+        total = 0
 
         for page in range(1, max_pages + 1):
             url = self._build_page_url(base_url, page)
@@ -74,15 +98,14 @@ class KijijiScraper:
             for listing in listings:
                 if listing.kijiji_id not in seen_ids:
                     seen_ids.add(listing.kijiji_id)
-                    all_listings.append(listing)
+                    total += 1
+                    yield listing
 
-            logger.info(f"Page {page}: found {len(listings)} listings (total: {len(all_listings)})")
+            logger.info(f"Page {page}: found {len(listings)} listings (total: {total})")
 
             if not has_next or len(listings) == 0:
                 break
 
-        return all_listings
-
     def _parse_search_page(self, html: str, base_url: str) -> tuple[list[ScrapedListing], bool]:
         """Parse a search results page. Returns (listings, has_next_page)."""
         soup = BeautifulSoup(html, "lxml")
@@ -465,27 +488,52 @@ class KijijiScraper:
         return detail
 
 
+class _RequestPacer:
+    """Spaces request starts made from several threads by a random delay.
+
+    Each caller reserves the next start time under the lock and sleeps
+    outside it; the first request waits a delay too, like _delay.
+    """
+
+    def __init__(self, delay_min: float, delay_max: float):
+        self.delay_min = delay_min
+        self.delay_max = delay_max
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic() + random.uniform(delay_min, delay_max)
+
+    def wait(self):
+        with self._lock:
+            start = max(self._next_start, time.monotonic())
+            self._next_start = start + random.uniform(self.delay_min, self.delay_max)
+        time.sleep(max(0.0, start - time.monotonic()))
+
+
 class RetailScraper:
     """Scraper for retailer/manufacturer pages."""
 
     def __init__(self, session: Optional[requests.Session] = None,
                  delay_min: float = 1.0, delay_max: float = 2.0):
-        self.session = session or requests.Session()
+        self.session = session or make_session()
         self.delay_min = delay_min
         self.delay_max = delay_max
         self._rotate_ua()
 
     def _rotate_ua(self):
-        self.session.headers.update({"User-Agent": random.choice(USER_AGENTS)})
+        self.session.headers.update({"User-Agent": next(_USER_AGENT_CYCLE)})
 
     def _delay(self):
         time.sleep(random.uniform(self.delay_min, self.delay_max))
 
-    def _get(self, url: str) -> str:
-        self._rotate_ua()
-        self._delay()
+    def _get(self, url: str, pacer: Optional[_RequestPacer] = None) -> str:
+        # Per-request User-Agent rather than _rotate_ua(): product pages may
+        # be fetched from several threads sharing this session.
+        headers = {"User-Agent": next(_USER_AGENT_CYCLE)}
+        if pacer is None:
+            self._delay()
+        else:
+            pacer.wait()
         try:
-            resp = self.session.get(url, timeout=30)
+            resp = self.session.get(url, headers=headers, timeout=30)
         except requests.RequestException as e:
             raise RuntimeError(f"Request failed for {url}: {e}") from e
         if resp.status_code != 200:
@@ -766,8 +814,9 @@ class RetailScraper:
             deduped.append(img)
         return deduped[:10]
 
-    def _scrape_shopify_product(self, url: str) -> list[ScrapedListing]:
-        html = self._get(url)
+    def _scrape_shopify_product(self, url: str,
+                                pacer: Optional[_RequestPacer] = None) -> list[ScrapedListing]:
+        html = self._get(url, pacer)
         soup = BeautifulSoup(html, "lxml")
         source = self._infer_source_from_url(url)
 
@@ -866,7 +915,7 @@ class RetailScraper:
         html = self._get(url)
 
         soup = BeautifulSoup(html, "lxml")
-        listings = []
+        product_urls = []
         seen_urls = set()
 
         for link in soup.find_all("a", href=True):
@@ -883,10 +932,25 @@ class RetailScraper:
                 continue
             if "voron" not in card_text.lower():
                 continue
+            product_urls.append(product_url)
+
+        # The workers share one pacer, so together they still send requests
+        # no faster than the configured delay.
+        pacer = _RequestPacer(self.delay_min, self.delay_max)
+
+        def scrape_product(product_url: str) -> list[ScrapedListing]:
             try:
-                listings.extend(self._scrape_shopify_product(product_url))
+                return self._scrape_shopify_product(product_url, pacer)
             except Exception as e:
                 logger.debug(f"Failed to parse formbot product {product_url}: {e}")
-                continue
+                return []
+
+        # Product pages are independent; fetch a few at a time (parsing and
+        # network waits overlap, request starts stay paced) and keep the
+        # collection page's order.
+        listings = []
+        with ThreadPoolExecutor(max_workers=FORMBOT_PRODUCT_WORKERS) as executor:
+            for product_listings in executor.map(scrape_product, product_urls):
+                listings.extend(product_listings)
 
         return listings
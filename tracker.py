@@ -1,74 +1,167 @@
 """Price tracking, brand detection, and deal scoring."""
 
-import json
+import heapq
 from datetime import datetime, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import orjson
 
 from models import Deal
 
 
-def _get_brand_keywords() -> dict[str, list[str]]:
-    """Get brand keywords from DB."""
+# Both caches below are swapped out as a single tuple rather than updated
+# in place, so a reader on another thread never pairs one generation with
+# another generation's data.
+
+# (generation, flat {keyword: brand} index in detection order: brands in
+# map order, a keyword listed under two brands kept for the first), rebuilt
+# only when the data generation changes; keyword edits bump it.
+_brand_keywords_cache: tuple[Optional[int], dict[str, str]] = (None, {})
+
+
+def _get_brand_keywords(generation: Optional[int] = None) -> dict[str, str]:
+    """Get the keyword -> brand index built from the DB."""
+    global _brand_keywords_cache
     import db
-    return db.get_brand_keywords_map()
+    if generation is None:
+        generation = db.get_data_generation()
+    cached_generation, index = _brand_keywords_cache
+    if cached_generation != generation:
+        index = {}
+        for brand, keywords in db.get_brand_keywords_map().items():
+            for kw in keywords:
+                index.setdefault(kw, brand)
+        _brand_keywords_cache = (generation, index)
+    return index
 
 
-def _get_msrp_data() -> dict:
-    """Get MSRP data from DB."""
+class _MsrpCache(NamedTuple):
+    """MSRP map plus lowercased model names per brand (and across all
+    brands, in map order) for detect_model."""
+    generation: Optional[int]
+    data: dict
+    models: dict
+    all_models: tuple
+
+
+# Rebuilt when the data generation changes.
+_msrp_cache = _MsrpCache(None, {}, {}, ())
+
+
+def _refresh_msrp_cache(generation: Optional[int] = None) -> _MsrpCache:
+    global _msrp_cache
     import db
-    return db.get_msrp_map()
+    if generation is None:
+        generation = db.get_data_generation()
+    cache = _msrp_cache
+    if cache.generation != generation:
+        data = db.get_msrp_map()
+        models = {
+            brand: tuple((name, name.lower()) for name in brand_models)
+            for brand, brand_models in data.items()
+        }
+        all_models = tuple(pair for brand_models in models.values() for pair in brand_models)
+        cache = _msrp_cache = _MsrpCache(generation, data, models, all_models)
+    return cache
+
+
+def _get_msrp_data(generation: Optional[int] = None) -> dict:
+    """Get MSRP data from DB."""
+    return _refresh_msrp_cache(generation).data
+
+
+def _match_brand(text: str, generation: Optional[int] = None) -> Optional[str]:
+    # Keywords are matched as substrings (they may contain spaces or '+'),
+    # so this stays a scan; the flat index just drops the nested loop and
+    # repeated keywords.
+    for kw, brand in _get_brand_keywords(generation).items():
+        if kw in text:
+            return brand
+    return None
+
+
+def _match_model(text: str, brand: Optional[str],
+                 generation: Optional[int] = None) -> Optional[str]:
+    cache = _refresh_msrp_cache(generation)
+
+    if brand and brand in cache.models:
+        candidates = cache.models[brand]
+    else:
+        candidates = cache.all_models
+    for model_name, model_lower in candidates:
+        if model_lower in text:
+            return model_name
+
+    return None
 
 
 def detect_brand(title: str, description: str = "") -> Optional[str]:
     """Detect brand from title and description."""
-    combined = f"{title} {description}".lower()
-    for brand, keywords in _get_brand_keywords().items():
-        for kw in keywords:
-            if kw in combined:
-                return brand
-    return None
+    return _match_brand(f"{title} {description}".lower())
 
 
 def detect_model(title: str, description: str = "", brand: Optional[str] = None) -> Optional[str]:
     """Detect specific model from title and description."""
-    combined = f"{title} {description}".lower()
-    msrp_data = _get_msrp_data()
+    return _match_model(f"{title} {description}".lower(), brand)
 
-    if brand and brand in msrp_data:
-        for model_name in msrp_data[brand]:
-            if model_name.lower() in combined:
-                return model_name
-    else:
-        for b, models in msrp_data.items():
-            for model_name in models:
-                if model_name.lower() in combined:
-                    return model_name
 
-    return None
+# Keyed on the lowercased text, which is all detection looks at; kept
+# small since descriptions can run to a few KB each.
+@lru_cache(maxsize=1024)
+def _detect_brand_model_cached(text: str, generation: int) -> tuple[Optional[str], Optional[str]]:
+    # Reuse the generation from the cache key rather than reading it from
+    # the DB again for each table.
+    brand = _match_brand(text, generation)
+    return brand, _match_model(text, brand, generation)
+
+
+def detect_brand_model(title: str, description: Optional[str] = "",
+                       generation: Optional[int] = None) -> tuple[Optional[str], Optional[str]]:
+    """detect_brand then detect_model, building the lowercased text only once.
 
+    Memoized per data generation, so relisted and re-scraped ads with the
+    same text skip detection, while keyword/MSRP edits still apply. A
+    missing description (None) is treated as empty. Callers looping over
+    many listings can read the generation once and pass it in.
+    """
+    if generation is None:
+        import db
+        generation = db.get_data_generation()
+    return _detect_brand_model_cached(f"{title} {description or ''}".lower(), generation)
 
-def lookup_msrp(brand: Optional[str], model: Optional[str]) -> Optional[float]:
+
+def lookup_msrp(brand: Optional[str], model: Optional[str],
+                generation: Optional[int] = None) -> Optional[float]:
     """Look up MSRP (CAD) for a brand/model combo."""
     if not brand or not model:
         return None
-    msrp_data = _get_msrp_data()
+    msrp_data = _get_msrp_data(generation)
     brand_data = msrp_data.get(brand, {})
     model_data = brand_data.get(model, {})
     return model_data.get("msrp_cad")
 
 
-def lookup_retail_price(brand: Optional[str], model: Optional[str]) -> Optional[float]:
+def lookup_retail_price(brand: Optional[str], model: Optional[str],
+                        generation: Optional[int] = None) -> Optional[float]:
     """Look up current retail price for a brand/model combo."""
     if not brand or not model:
         return None
-    msrp_data = _get_msrp_data()
+    msrp_data = _get_msrp_data(generation)
     brand_data = msrp_data.get(brand, {})
     model_data = brand_data.get(model, {})
     return model_data.get("retail_price")
 
 
-def compute_deals(listings: list[dict]) -> list[Deal]:
-    """Compute deal scores for listings with price drops."""
+def compute_deals(listings: list[dict], limit: Optional[int] = None) -> list[Deal]:
+    """Compute deal scores for listings with price drops.
+
+    With ``limit``, only the top ``limit`` deals are returned (same order as
+    the full sort) without sorting the rest.
+    """
+    import db
+    # One generation read for the whole batch instead of one per listing.
+    generation = db.get_data_generation()
     deals = []
 
     for listing in listings:
@@ -85,7 +178,7 @@ def compute_deals(listings: list[dict]) -> list[Deal]:
         model = listing.get("model")
         
         # Get retail price from database
-        retail_price = lookup_retail_price(brand, model) if brand and model else None
+        retail_price = lookup_retail_price(brand, model, generation) if brand and model else None
         
         # Calculate comparison metrics
         msrp_ratio = (current / msrp) if msrp and msrp > 0 else None
@@ -115,8 +208,8 @@ def compute_deals(listings: list[dict]) -> list[Deal]:
         image_urls = listing.get("image_urls", "[]")
         if isinstance(image_urls, str):
             try:
-                image_urls = json.loads(image_urls)
-            except (json.JSONDecodeError, TypeError):
+                image_urls = orjson.loads(image_urls)
+            except orjson.JSONDecodeError:
                 image_urls = []
 
         deals.append(Deal(
@@ -162,5 +255,7 @@ def compute_deals(listings: list[dict]) -> list[Deal]:
         
         return score
     
+    if limit is not None:
+        return heapq.nlargest(limit, deals, key=deal_score)
     deals.sort(key=deal_score, reverse=True)
     return deals